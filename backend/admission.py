@@ -0,0 +1,166 @@
+"""
+Адаптивное ограничение числа одновременных запросов (load shedding).
+
+Когда MySQL замедляется, запросы копятся в threadpool и по таймауту падают
+все эндпоинты сразу. AdmissionMiddleware держит не больше `limit` запросов
+в работе и сразу отвечает 503 + Retry-After остальным. Лимит подбирается
+по AIMD: растёт на 1 за "окно" из limit быстрых ответов и умножается на
+LOAD_SHED_BACKOFF, если ответы медленнее LOAD_SHED_TARGET_LATENCY_MS.
+Задержка считается до начала ответа; массовый импорт и экспорт в подстройку
+не попадают.
+
+У каждого маршрута свой класс приоритета: низкоприоритетным (регистрация,
+массовый импорт) достаётся только доля лимита, поэтому при перегрузке первыми
+отклоняются они, а /users/me и logout продолжают обслуживаться.
+"""
+from fastapi.responses import JSONResponse
+from config import settings
+import time
+import metrics
+
+PRIORITY_CRITICAL = "critical"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+
+# Доля лимита, доступная классу: low отклоняется, когда занято 60% слотов
+PRIORITY_SHARES = {
+    PRIORITY_CRITICAL: 1.0,
+    PRIORITY_NORMAL: 0.85,
+    PRIORITY_LOW: 0.6,
+}
+
+# Префикс пути -> приоритет; первый совпавший. Остальное - PRIORITY_NORMAL
+ROUTE_PRIORITIES = (
+    ("/users/me", PRIORITY_CRITICAL),
+    ("/logout", PRIORITY_CRITICAL),
+    ("/refresh", PRIORITY_CRITICAL),
+    ("/admin/users/import", PRIORITY_LOW),
+    ("/admin/users/export", PRIORITY_LOW),
+    ("/register", PRIORITY_LOW),
+)
+
+# Пробы балансировщика и метрики не ограничиваются: они не ходят в БД
+EXEMPT_PATHS = ("/health", "/metrics")
+
+# Массовые операции занимают слот, но их длительность зависит от объёма данных,
+# а не от нагрузки - в подстройку лимита они не попадают
+NO_FEEDBACK_PATHS = ("/admin/users/import", "/admin/users/export")
+
+def route_priority(path: str) -> str:
+    for prefix, priority in ROUTE_PRIORITIES:
+        if path.startswith(prefix):
+            return priority
+    return PRIORITY_NORMAL
+
+class AdaptiveLimit:
+    """
+    AIMD-лимит параллелизма. Все методы вызываются из event loop одного воркера,
+    поэтому блокировки не нужны.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, target_latency: float, backoff: float):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._last_decrease = 0.0
+
+    def try_acquire(self, priority: str = PRIORITY_NORMAL) -> bool:
+        if self.in_flight >= max(1, int(self.limit * PRIORITY_SHARES[priority])):
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self, latency: float = None, overloaded: bool = False):
+        """latency=None - освободить слот без сигнала для AIMD."""
+        in_flight = self.in_flight
+        self.in_flight -= 1
+        if latency is None:
+            return
+        now = time.monotonic()
+        if overloaded or latency > self.target_latency:
+            # Не чаще раза за target_latency: медленные ответы одной волны - один сигнал
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif in_flight >= self.limit / 2:
+            # Растём, только если лимит действительно использовался
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "target_latency_ms": self.target_latency * 1000,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+class AdmissionMiddleware:
+    """ASGI-middleware: допуск по AdaptiveLimit с учётом приоритета маршрута."""
+
+    def __init__(self, app, limiter: AdaptiveLimit = None, retry_after: int = 1):
+        self.app = app
+        self.limiter = limiter or admission_limit
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        priority = route_priority(scope["path"])
+        if not self.limiter.try_acquire(priority):
+            metrics.LOAD_SHED_REJECTIONS.inc(priority)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Сервер перегружен, попробуйте позже."},
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        feedback = not scope["path"].startswith(NO_FEEDBACK_PATHS)
+        status_holder = [500]
+        started = time.monotonic()
+        # Задержка - до начала ответа: отдача потокового тела к перегрузке не относится
+        latency = [None]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+                latency[0] = time.monotonic() - started
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if latency[0] is None:
+                latency[0] = time.monotonic() - started
+            # 503 изнутри (пул bcrypt) и 504 - тоже признак перегрузки
+            self.limiter.release(
+                latency[0] if feedback else None,
+                overloaded=feedback and status_holder[0] in (503, 504),
+            )
+
+admission_limit = AdaptiveLimit(
+    initial=settings.LOAD_SHED_INITIAL_LIMIT,
+    min_limit=settings.LOAD_SHED_MIN_LIMIT,
+    max_limit=settings.LOAD_SHED_MAX_LIMIT,
+    target_latency=settings.LOAD_SHED_TARGET_LATENCY_MS / 1000,
+    backoff=settings.LOAD_SHED_BACKOFF,
+)
+
+@metrics.register_collector
+def _admission_metrics():
+    stats = admission_limit.stats()
+    yield "load_shed_limit", "gauge", "Current adaptive concurrency limit", {}, stats["limit"]
+    yield "load_shed_in_flight", "gauge", "Requests admitted and not yet finished", {}, stats["in_flight"]
@@ -0,0 +1,175 @@
+"""
+Журнал событий аутентификации без INSERT в обработчиках запросов.
+
+audit_log.record() кладёт событие в ограниченную очередь и сразу возвращается.
+Фоновый поток забирает события и вставляет их пачками многострочным INSERT,
+как только набралось AUDIT_BATCH_SIZE событий или прошло AUDIT_FLUSH_INTERVAL_SECONDS.
+При переполнении очереди событие отбрасывается (AUDIT_DROP_POLICY) - вход
+пользователя важнее записи в журнал. При остановке очередь дописывается до конца.
+"""
+from datetime import datetime
+from sqlalchemy import insert
+from config import settings
+from database import engine
+import logging
+import queue
+import threading
+import time
+import metrics
+import models
+
+logger = logging.getLogger("app")
+
+DROP_POLICIES = ("drop_new", "drop_oldest")
+
+class AuditLog:
+    def __init__(self, engine, max_queue: int, batch_size: int, flush_interval: float,
+                 drop_policy: str = "drop_new", enabled: bool = True):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"AUDIT_DROP_POLICY must be one of {DROP_POLICIES}")
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.enabled = enabled
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def record(self, event: str, request=None, email: str = None, user_id: int = None, detail: str = None):
+        if not self.enabled:
+            return
+        ip = user_agent = None
+        if request is not None:
+            ip = request.client.host if request.client else None
+            user_agent = (request.headers.get("user-agent") or "")[:255] or None
+        row = {
+            "event": event,
+            "email": email,
+            "user_id": user_id,
+            "ip": ip,
+            "user_agent": user_agent,
+            "detail": detail[:255] if detail else None,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            if self.drop_policy == "drop_new":
+                self._count_lost()
+                return
+            # drop_oldest: освобождаем место за счёт самого старого события
+            try:
+                self._queue.get_nowait()
+                self._count_lost()
+                self._queue.put_nowait(row)
+            except (queue.Empty, queue.Full):
+                self._count_lost()
+                return
+        with self._lock:
+            self.enqueued += 1
+
+    def _count_lost(self, amount: int = 1, outcome: str = "dropped"):
+        with self._lock:
+            if outcome == "dropped":
+                self.dropped += amount
+            else:
+                self.failed += amount
+        metrics.AUDIT_EVENTS.inc(outcome, amount=amount)
+
+    def _next_batch(self) -> list:
+        """Ждёт первое событие не дольше flush_interval, затем добирает пачку до batch_size."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        started = time.perf_counter()
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(models.AuditEvent.__table__), batch)
+        except Exception:
+            logger.exception("Audit batch write failed", extra={"events": len(batch)})
+            self._count_lost(len(batch), outcome="failed")
+            return
+        metrics.AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        metrics.AUDIT_EVENTS.inc("written", amount=len(batch))
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Синхронно записывает всё, что сейчас в очереди (для тестов и остановки без потока)."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                logger.warning("Audit writer did not finish in time", extra={"pending": self._queue.qsize()})
+            self._thread = None
+        else:
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queued": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "drop_policy": self.drop_policy,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
+
+audit_log = AuditLog(
+    engine,
+    max_queue=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_SECONDS,
+    drop_policy=settings.AUDIT_DROP_POLICY,
+    enabled=settings.AUDIT_ENABLED,
+)
+
+@metrics.register_collector
+def _audit_metrics():
+    yield "audit_queue_size", "gauge", "Audit events waiting for the writer", {}, audit_log.stats()["queued"]
@@ -1,15 +1,38 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Optional
+from calendar import timegm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from jose import JWTError, jwt
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError
 from config import settings
+from cache import TTLCache
+import metrics
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
 
 # Секретный ключ для JWT (в продакшене должен быть сложным и скрытым)
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_MIN_ROUNDS or settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_MAX_ROUNDS or settings.BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -17,12 +40,267 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def password_needs_update(hashed_password) -> bool:
+    """Хеш создан с другой стоимостью (вне BCRYPT_MIN/MAX_ROUNDS) или устаревшей схемой."""
+    return pwd_context.needs_update(hashed_password)
+
+def _timed_call(fn, *args):
+    # Выполняется внутри воркера пула; monotonic сравним между процессами
+    started = time.monotonic()
+    result = fn(*args)
+    return started, time.monotonic(), result
+
+class PasswordHashingBusy(Exception):
+    """Пул хеширования переполнен - запрос нужно отклонить сразу (503), а не ставить в очередь."""
+
+class PasswordHasher:
+    """
+    Выделенный пул для bcrypt, чтобы хеширование не занимало threadpool FastAPI
+    и event loop. Очередь ограничена: при переполнении бросается PasswordHashingBusy.
+    bcrypt отпускает GIL, поэтому пул потоков масштабируется по ядрам;
+    пул процессов полностью изолирует CPU-нагрузку от процесса uvicorn.
+    """
+
+    def __init__(self, workers: int, max_queue: int, executor: str = "thread"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor_kind = executor
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.calls = 0
+        self.rejected = 0
+        self.queue_wait_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+        self.max_hash_seconds = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                metrics.PASSWORD_HASH_REJECTIONS.inc()
+                raise PasswordHashingBusy()
+            self._pending += 1
+
+    def _release(self, submitted: float, started: float, finished: float):
+        with self._lock:
+            self._pending -= 1
+            if started is None:
+                return
+            wait, elapsed = started - submitted, finished - started
+            self.calls += 1
+            self.queue_wait_seconds += wait
+            self.hash_seconds += elapsed
+            self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, wait)
+            self.max_hash_seconds = max(self.max_hash_seconds, elapsed)
+        metrics.PASSWORD_HASH_QUEUE_WAIT.observe(wait)
+        metrics.PASSWORD_HASH_SECONDS.observe(elapsed)
+
+    async def run(self, fn, *args):
+        self._acquire()
+        submitted = time.monotonic()
+        started = finished = None
+        try:
+            future = self._get_executor().submit(_timed_call, fn, *args)
+            started, finished, result = await asyncio.wrap_future(future)
+            return result
+        finally:
+            self._release(submitted, started, finished)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.executor_kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._pending,
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "queue_wait_seconds_total": self.queue_wait_seconds,
+                "queue_wait_seconds_max": self.max_queue_wait_seconds,
+                "hash_seconds_total": self.hash_seconds,
+                "hash_seconds_max": self.max_hash_seconds,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    executor=settings.PASSWORD_HASH_EXECUTOR,
+)
+
+@metrics.register_collector
+def _password_hasher_metrics():
+    yield "password_hash_in_flight", "gauge", "bcrypt jobs running or queued", {}, password_hasher.stats()["in_flight"]
+
+async def verify_password_async(plain_password, hashed_password):
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await password_hasher.run(get_password_hash, password)
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+class TokenCodec:
+    """
+    Подпись и проверка JWT с ключом и заголовком, подготовленными один раз.
+    Для HS256/384/512 работает напрямую через hmac; токены с другим заголовком
+    и прочие алгоритмы обрабатывает python-jose. Формат совпадает с jose,
+    поэтому ранее выданные токены остаются действительными.
+    """
+
+    HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+    def __init__(self, secret_key: str, algorithm: str):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self._digest = self.HMAC_DIGESTS.get(algorithm)
+        self._key = secret_key.encode()
+        header = json.dumps({"alg": algorithm, "typ": "JWT"}, separators=(",", ":"), sort_keys=True)
+        self._header = _b64encode(header.encode())
+
+    def encode(self, claims: dict) -> str:
+        if self._digest is None:
+            return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+        claims = dict(claims)
+        for claim in ("exp", "iat", "nbf"):
+            if isinstance(claims.get(claim), datetime):
+                claims[claim] = timegm(claims[claim].utctimetuple())
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        signing_input = self._header + b"." + payload
+        signature = hmac.new(self._key, signing_input, self._digest).digest()
+        return (signing_input + b"." + _b64encode(signature)).decode()
+
+    def decode(self, token: str) -> dict:
+        if self._digest is None:
+            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        try:
+            signing_input, signature = token.encode().rsplit(b".", 1)
+            header, payload = signing_input.split(b".")
+        except (UnicodeEncodeError, ValueError):
+            raise JWTError("Not enough segments")
+        if header != self._header:
+            # Другой порядок полей, kid и т.п. - полная проверка заголовка в jose
+            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        try:
+            expected = hmac.new(self._key, signing_input, self._digest).digest()
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                raise JWTError("Signature verification failed.")
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, TypeError) as e:
+            raise JWTError("Invalid token") from e
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload")
+        now = timegm(datetime.utcnow().utctimetuple())
+        if "exp" in claims:
+            if not isinstance(claims["exp"], (int, float)):
+                raise JWTClaimsError("Expiration Time claim (exp) must be an integer.")
+            if claims["exp"] < now:
+                raise ExpiredSignatureError("Signature has expired.")
+        if "nbf" in claims:
+            if not isinstance(claims["nbf"], (int, float)):
+                raise JWTClaimsError("Not Before claim (nbf) must be an integer.")
+            if claims["nbf"] > now:
+                raise JWTClaimsError("The token is not yet valid (nbf)")
+        return claims
+
+token_codec = TokenCodec(SECRET_KEY, ALGORITHM)
+
+# Уже проверенные токены: sha256(token) -> claims. Запись живёт не дольше exp,
+# поэтому повторные запросы той же сессии не пересчитывают подпись.
+token_cache = TTLCache(settings.TOKEN_CACHE_MAX_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+
+@metrics.register_collector
+def _token_cache_metrics():
+    stats = token_cache.stats()
+    yield "token_cache_entries", "gauge", "Entries in the verified JWT cache", {}, stats["size"]
+    for event_name in ("hits", "misses", "evictions"):
+        yield "token_cache_events_total", "counter", "Verified JWT cache lookups and removals", {"event": event_name}, stats[event_name]
+
+def verify_token(token: str) -> dict:
+    if not settings.TOKEN_CACHE_ENABLED:
+        return token_codec.decode(token)
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is None:
+        claims = token_codec.decode(token)
+        ttl = settings.TOKEN_CACHE_TTL_SECONDS
+        if isinstance(claims.get("exp"), (int, float)):
+            ttl = min(ttl, claims["exp"] - time.time())
+        if ttl > 0:
+            token_cache.set(key, claims, ttl_seconds=ttl)
+    return dict(claims)
+
+_dummy_hash = None
+
+def prepare_dummy_hash():
+    """
+    Считает хеш для verify_dummy_password при запуске: иначе первый вход
+    с неизвестным email дольше остальных на целый bcrypt и выдаёт себя по времени.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = get_password_hash(secrets.token_urlsafe(16))
+
+async def verify_dummy_password(plain_password):
+    """
+    Проверка против хеша с текущей стоимостью для несуществующего email:
+    ответ по времени не отличается от неверного пароля существующего аккаунта.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await get_password_hash_async(secrets.token_urlsafe(16))
+    await verify_password_async(plain_password, _dummy_hash)
+    return False
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    to_encode.setdefault("type", ACCESS_TOKEN_TYPE)
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = token_codec.encode(to_encode)
     return encoded_jwt
+
+def create_refresh_token(email: str, jti: str, expires_delta: timedelta):
+    return create_access_token(
+        data={"sub": email, "jti": jti, "type": REFRESH_TOKEN_TYPE},
+        expires_delta=expires_delta,
+    )
+
+def refresh_token_days(remember_me: bool) -> int:
+    return settings.REFRESH_TOKEN_REMEMBER_ME_DAYS if remember_me else settings.REFRESH_TOKEN_EXPIRE_DAYS
+
+def new_token_id() -> str:
+    return secrets.token_urlsafe(32)
+
+def decode_token(token: str, token_type: str = ACCESS_TOKEN_TYPE) -> dict:
+    """
+    Проверяет подпись и срок действия. Токены без "type" выданы до появления
+    refresh-токенов и считаются access-токенами.
+    """
+    payload = verify_token(token)
+    if payload.get("type", ACCESS_TOKEN_TYPE) != token_type:
+        raise JWTError("Unexpected token type")
+    return payload
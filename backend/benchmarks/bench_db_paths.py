@@ -0,0 +1,61 @@
+"""
+Нагрузочное сравнение синхронного (Session в threadpool) и асинхронного
+(AsyncSession) пути к БД на /users/me.
+
+Для каждого режима поднимается отдельный процесс uvicorn с DB_ASYNC=false/true
+на свежей SQLite-базе (или на --url), регистрируется пользователь, после чего
+/users/me обстреливается с заданной параллельностью.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_db_paths --concurrency 500 --requests 10000
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+
+import httpx
+
+from benchmarks.common import run_load, start_server, wait_ready
+
+async def drive(base_url: str, concurrency: int, total: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        r = await client.post("/register", json={
+            "email": "bench-paths@example.com", "password": "BenchPass1", "full_name": "Bench",
+        })
+        r.raise_for_status()
+        cookies = {"access_token": r.cookies["access_token"]}
+        return await run_load(lambda i: client.get("/users/me", cookies=cookies), total, concurrency)
+
+def run_mode(mode: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            "DB_ASYNC": "true" if mode == "async" else "false",
+            "DB_MIGRATE_ON_STARTUP": "true",
+            "DATABASE_URL": args.url or f"sqlite:///{tmp}/bench_paths.db",
+        }
+        server = start_server(args.port, env)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            asyncio.run(wait_ready(base_url))
+            result = asyncio.run(drive(base_url, args.concurrency, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+    return {"mode": mode, "concurrency": args.concurrency, **result}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="DATABASE_URL; по умолчанию временная SQLite-база")
+    args = parser.parse_args()
+
+    modes = ["sync", "async"] if args.mode == "both" else [args.mode]
+    print(json.dumps([run_mode(mode, args) for mode in modes], indent=2))
+
+if __name__ == "__main__":
+    main()
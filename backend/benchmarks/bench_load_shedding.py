@@ -0,0 +1,131 @@
+"""
+Симуляция медленной БД: goodput с адаптивным ограничением (admission.py) и без него.
+
+Приложение-заглушка обслуживает /users/me, /login и /register; каждый запрос
+занимает одно из --db-connections соединений на --db-ms миллисекунд.
+Нагрузка открытая (--rps запросов в секунду независимо от ответов) и больше
+пропускной способности "БД". Клиент ждёт ответ не дольше --timeout, но сервер,
+как и настоящий, дорабатывает брошенные запросы. Goodput - успешные ответы,
+уложившиеся в таймаут клиента.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_load_shedding
+    python -m benchmarks.bench_load_shedding --rps 400 --db-ms 50 --db-connections 5 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from admission import AdaptiveLimit, AdmissionMiddleware
+from benchmarks.common import percentile
+
+# Доли трафика по маршрутам
+TRAFFIC = (("/users/me", 0.6), ("/login", 0.25), ("/register", 0.15))
+
+def make_app(db_connections: int, db_seconds: float):
+    pool = asyncio.Semaphore(db_connections)
+
+    async def app(scope, receive, send):
+        async with pool:
+            await asyncio.sleep(db_seconds * random.uniform(0.8, 1.2))
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    return app
+
+async def call(app, path: str) -> int:
+    scope = {"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b""}
+    status = [0]
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status[0] = message["status"]
+
+    await app(scope, receive, send)
+    return status[0]
+
+async def client(app, path: str, timeout: float, results: dict):
+    started = time.perf_counter()
+    # shield: после таймаута клиента сервер продолжает работу, как при обрыве соединения
+    task = asyncio.ensure_future(call(app, path))
+    try:
+        status = await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        results[path]["timeout"] += 1
+        return
+    bucket = results[path]
+    if status == 200:
+        bucket["ok"] += 1
+        bucket["latencies"].append(time.perf_counter() - started)
+    else:
+        bucket["shed"] += 1
+
+async def run(shedding: bool, rps: float, seconds: float, db_connections: int, db_ms: float,
+              timeout: float, target_ms: float) -> dict:
+    app = make_app(db_connections, db_ms / 1000)
+    limiter = None
+    if shedding:
+        limiter = AdaptiveLimit(initial=64, min_limit=2, max_limit=512, target_latency=target_ms / 1000, backoff=0.9)
+        app = AdmissionMiddleware(app, limiter=limiter)
+
+    results = {path: {"ok": 0, "shed": 0, "timeout": 0, "latencies": []} for path, _ in TRAFFIC}
+    paths, weights = zip(*TRAFFIC)
+    tasks = []
+    started = time.perf_counter()
+    interval = 1 / rps
+    for i in range(int(rps * seconds)):
+        # Открытая нагрузка: следующий запрос по расписанию, а не после ответа
+        delay = started + i * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        path = random.choices(paths, weights)[0]
+        tasks.append(asyncio.ensure_future(client(app, path, timeout, results)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    summary = {"shedding": shedding, "elapsed_s": round(elapsed, 2)}
+    total_ok = 0
+    for path, bucket in results.items():
+        latencies = sorted(bucket.pop("latencies"))
+        total_ok += bucket["ok"]
+        summary[path] = {
+            **bucket,
+            "goodput_rps": round(bucket["ok"] / seconds, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        }
+    summary["goodput_rps"] = round(total_ok / seconds, 1)
+    summary["capacity_rps"] = round(db_connections / (db_ms / 1000), 1)
+    if limiter is not None:
+        summary["final_limit"] = round(limiter.limit, 1)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=300, help="предлагаемая нагрузка, запросов/с")
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--db-connections", type=int, default=5, help="соединений в пуле \"БД\"")
+    parser.add_argument("--db-ms", type=float, default=50, help="время запроса к \"БД\", мс")
+    parser.add_argument("--timeout", type=float, default=1.0, help="таймаут клиента, с")
+    parser.add_argument("--target-ms", type=float, default=250, help="целевая латентность лимитера, мс")
+    parser.add_argument("--output", help="записать JSON в файл")
+    args = parser.parse_args()
+
+    results = []
+    for shedding in (False, True):
+        results.append(asyncio.run(run(
+            shedding, args.rps, args.seconds, args.db_connections, args.db_ms, args.timeout, args.target_ms
+        )))
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Микробенчмарк запросов пользователя по email: прежний db.query(User) с полной
+ORM-сущностью против заранее собранных запросов crud.py.
+
+legacy_orm_query      - db.query(User).filter(User.email == email).first()
+orm_entity            - crud.get_user_by_email (select + кеш компиляции, полная сущность)
+auth_projection       - crud.get_auth_user (поля schemas.User, без хешей)
+credential_projection - crud.get_user_credentials (для /login)
+email_exists          - crud.email_exists (для /register)
+
+База - временная SQLite с --users пользователями (или --url). Вход и регистрация
+ищут случайные адреса в разном регистре, остальные - точный email, как в токене.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_queries
+    python -m benchmarks.bench_queries --users 50000 --number 5000 --output queries.json
+"""
+import argparse
+import json
+import random
+import tempfile
+import timeit
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+from database import Base
+
+def _time(fn, number: int, repeat: int) -> dict:
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return {"us_per_call": round(best / number * 1e6, 2), "calls_per_sec": round(number / best)}
+
+def _seed(engine, users: int):
+    Base.metadata.create_all(engine)
+    rows = [
+        {
+            "email": f"user{i}@example.com",
+            "email_normalized": f"user{i}@example.com",
+            "full_name": f"User {i}",
+            "hashed_password": "$2b$12$" + "x" * 53,
+            "role": models.User.ROLE_USER,
+            "is_active": True,
+        }
+        for i in range(users)
+    ]
+    with engine.begin() as connection:
+        for start in range(0, len(rows), 1000):
+            connection.execute(insert(models.User), rows[start:start + 1000])
+
+def run(url: str, users: int, number: int, repeat: int) -> dict:
+    engine = create_engine(url)
+    _seed(engine, users)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    emails = [f"user{random.randrange(users)}@example.com" for _ in range(1000)]
+    mixed_case = [email.upper() if i % 2 else email for i, email in enumerate(emails)]
+    picks = iter(range(10 ** 9))
+
+    def next_email(source):
+        return source[next(picks) % len(source)]
+
+    results = {}
+    with Session() as db:
+        def legacy():
+            # Прежний путь: точное совпадение, без учёта регистра не находит
+            db.query(models.User).filter(models.User.email == next_email(emails)).first()
+            db.expunge_all()
+
+        def orm_entity():
+            crud.get_user_by_email(db, next_email(emails))
+            db.expunge_all()
+
+        cases = {
+            "legacy_orm_query": legacy,
+            "orm_entity": orm_entity,
+            "auth_projection": lambda: crud.get_auth_user(db, next_email(emails)),
+            "credential_projection": lambda: crud.get_user_credentials(db, next_email(mixed_case)),
+            "email_exists": lambda: crud.email_exists(db, next_email(mixed_case)),
+        }
+        assert crud.get_user_credentials(db, mixed_case[1]) is not None
+        for name, fn in cases.items():
+            results[name] = _time(fn, number, repeat)
+    engine.dispose()
+
+    baseline = results["legacy_orm_query"]["us_per_call"]
+    for result in results.values():
+        result["speedup_vs_legacy"] = round(baseline / result["us_per_call"], 2)
+    return {"users": users, "number": number, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--number", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", help="DATABASE_URL пустой базы; по умолчанию временная SQLite")
+    parser.add_argument("--output", help="записать JSON в файл")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run(args.url or f"sqlite:///{tmp}/bench_queries.db", args.users, args.number, args.repeat)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Микробенчмарк накладных расходов лимитера на один запрос.
+
+Измеряет стоимость limiter.hit() (то, что slowapi вызывает на каждый
+декорированный запрос) для разных хранилищ и стратегий.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_rate_limit --iterations 20000
+    python -m benchmarks.bench_rate_limit --storage redis://localhost:6379
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES
+
+import rate_limit  # noqa: F401 - регистрирует схему sqlite:// в limits
+
+def bench(storage_uri: str, strategy: str, iterations: int, keys: int) -> dict:
+    storage = storage_from_string(storage_uri)
+    limiter = STRATEGIES[strategy](storage)
+    item = parse(f"{iterations * 10}/minute")
+    started = time.perf_counter()
+    for i in range(iterations):
+        limiter.hit(item, "bench", str(i % keys))
+    elapsed = time.perf_counter() - started
+    storage.reset()
+    return {
+        "storage": storage_uri.split("://")[0],
+        "strategy": strategy,
+        "iterations": iterations,
+        "us_per_hit": round(elapsed / iterations * 1e6, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=100, help="число различных клиентов (IP)")
+    parser.add_argument("--storage", action="append", help="URI хранилища; по умолчанию memory:// и sqlite")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storages = args.storage or ["memory://", f"sqlite:///{os.path.join(tmp, 'ratelimit.db')}"]
+        results = []
+        for uri in storages:
+            for strategy in ("fixed-window", "sliding-window-counter", "moving-window"):
+                try:
+                    results.append(bench(uri, strategy, args.iterations, args.keys))
+                except NotImplementedError:
+                    continue
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Проверка single-flight: сколько запросов к users выполняет пачка одновременных
+/users/me при пустом кеше пользователей.
+
+Приложение вызывается в процессе (httpx.ASGITransport) на временной SQLite-базе
+с --keys пользователями. Каждый запрос к БД задерживается на --db-ms, как
+у удалённого MySQL. Для каждой пачки кеш очищается, затем --concurrency
+запросов по --keys пользователям уходят одновременно. Single-flight включён
+и выключен по очереди; с ним должно выполняться ровно --keys запросов на пачку
+(иначе код возврата 1).
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_single_flight
+    DB_ASYNC=true python -m benchmarks.bench_single_flight --concurrency 200 --keys 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+def _prepare_env(tmp: str, concurrency: int):
+    # До импорта приложения: settings и движок читают окружение при импорте
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench_single_flight.db"
+    os.environ.setdefault("DB_ASYNC", "false")
+    # Без single-flight каждому запросу пачки нужно своё соединение
+    os.environ.setdefault("DB_POOL_SIZE", str(concurrency))
+    os.environ["AUDIT_ENABLED"] = "false"
+    os.environ["LOAD_SHED_ENABLED"] = "false"
+
+async def burst(client, tokens: list, concurrency: int) -> list:
+    requests = [
+        client.get("/users/me", cookies={"access_token": tokens[i % len(tokens)]})
+        for i in range(concurrency)
+    ]
+    return [response.status_code for response in await asyncio.gather(*requests)]
+
+async def run(keys: int, concurrency: int, bursts: int, db_ms: float) -> list:
+    import httpx
+    from sqlalchemy import event
+
+    import auth, crud, database, migrate, schemas
+    from cache import user_cache
+    from main import app
+    from singleflight import user_lookups
+
+    migrate.upgrade(database.engine)
+    tokens = []
+    with database.SessionLocal() as db:
+        for i in range(keys):
+            user = crud.create_user(db, schemas.UserCreate(
+                email=f"flight{i}@example.com", password="FlightPass1", full_name=f"Flight {i}",
+            ), hashed_password="x")
+            tokens.append(auth.create_access_token({"sub": user.email, "role": user.role, "active": user.is_active}))
+
+    queries = [0]
+    engines = [database.engine] + ([database.async_engine.sync_engine] if database.async_engine is not None else [])
+    for engine in engines:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+                queries[0] += 1
+                time.sleep(db_ms / 1000)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for enabled in (False, True):
+            user_lookups.enabled = enabled
+            per_burst, statuses = [], []
+            started = time.perf_counter()
+            for _ in range(bursts):
+                user_cache.clear()
+                before = queries[0]
+                statuses += await burst(client, tokens, concurrency)
+                per_burst.append(queries[0] - before)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "single_flight": enabled,
+                "db_async": database.async_engine is not None,
+                "keys": keys,
+                "concurrency": concurrency,
+                "queries_per_burst": per_burst,
+                "errors": sum(1 for code in statuses if code != 200),
+                "burst_ms": round(elapsed / bursts * 1000, 1),
+            })
+    results.append({"user_lookups": user_lookups.stats()})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=3, help="разных пользователей в пачке")
+    parser.add_argument("--concurrency", type=int, default=60, help="одновременных запросов в пачке")
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--db-ms", type=float, default=20, help="задержка запроса к users, мс")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _prepare_env(tmp, args.concurrency)
+        results = asyncio.run(run(args.keys, args.concurrency, args.bursts, args.db_ms))
+    print(json.dumps(results, indent=2))
+    coalesced = next(result for result in results if result.get("single_flight"))
+    ok = all(count == args.keys for count in coalesced["queries_per_burst"]) and not coalesced["errors"]
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Пропускная способность /users/me: прежний обработчик против быстрого пути
+(serialization.user_response) и ответа 304 по If-None-Match.
+
+legacy   - прежний код: синхронный обработчик в threadpool, повторная
+           валидация response_model=schemas.User и сериализация FastAPI
+fast     - текущий /users/me: async, байты из USER_SERIALIZER, ETag
+not_mod  - текущий /users/me с If-None-Match: 304 без тела
+
+Приложение вызывается в процессе напрямую по ASGI, так что измеряется
+стоимость обработки на сервере без сети и HTTP-клиента; кеш пользователей
+включён, как в проде.
+Плюс микробенчмарк одной сериализации профиля.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_users_me
+    python -m benchmarks.bench_users_me --requests 5000 --concurrency 50 --output users_me.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import timeit
+
+def _prepare_env(tmp: str):
+    # До импорта приложения: settings и движок читают окружение при импорте
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench_users_me.db"
+    os.environ["AUDIT_ENABLED"] = "false"
+    os.environ["LOAD_SHED_ENABLED"] = "false"
+
+async def _call(app, path: str, headers: list) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    status = [0]
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status[0] = message["status"]
+
+    await app(scope, receive, send)
+    return status[0]
+
+async def _throughput(app, path: str, headers: list, total: int, concurrency: int, expect: int) -> dict:
+    # Прямой ASGI-вызов без HTTP-клиента: измеряется только работа сервера
+    errors = 0
+    started = time.perf_counter()
+    for offset in range(0, total, concurrency):
+        batch = [_call(app, path, headers) for _ in range(min(concurrency, total - offset))]
+        errors += sum(1 for status in await asyncio.gather(*batch) if status != expect)
+    elapsed = time.perf_counter() - started
+    return {"requests": total, "errors": errors, "requests_per_sec": round(total / elapsed, 1)}
+
+def _serialization(number: int) -> dict:
+    from datetime import datetime
+    import schemas
+    from serialization import USER_SERIALIZER
+
+    user = schemas.User(
+        id=1, email="bench@example.com", full_name="Bench User", role="user",
+        is_active=True, created_at=datetime(2026, 1, 1),
+    )
+    cases = {
+        "validate_and_dump": lambda: schemas.User.model_validate(user).model_dump_json(),
+        "precompiled_dump": lambda: USER_SERIALIZER.dump_json(user),
+    }
+    return {
+        name: round(min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6, 3)
+        for name, fn in cases.items()
+    }
+
+async def run(total: int, concurrency: int) -> dict:
+    import httpx
+    from fastapi import Depends
+
+    import auth, crud, database, migrate, schemas
+    from dependencies import get_current_user
+    from main import app
+
+    @app.get("/bench/legacy-me", response_model=schemas.User)
+    def legacy_me(current_user: schemas.User = Depends(get_current_user)):
+        return current_user
+
+    migrate.upgrade(database.engine)
+    with database.SessionLocal() as db:
+        user = crud.create_user(db, schemas.UserCreate(
+            email="bench-me@example.com", password="BenchPass1", full_name="Bench",
+        ), hashed_password="x")
+        token = auth.create_access_token({"sub": user.email, "role": user.role, "active": user.is_active})
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies={"access_token": token}) as client:
+        first = await client.get("/users/me")
+        legacy_body = (await client.get("/bench/legacy-me")).json()
+        assert first.json() == legacy_body, "fast path must return the same JSON"
+        etag = first.headers["etag"]
+
+    cookie = [(b"cookie", f"access_token={token}".encode())]
+    # Прогрев: кеш пользователей и кеши компиляции SQLAlchemy
+    await _throughput(app, "/bench/legacy-me", cookie, 200, concurrency, 200)
+    results = {
+        "legacy": await _throughput(app, "/bench/legacy-me", cookie, total, concurrency, 200),
+        "fast": await _throughput(app, "/users/me", cookie, total, concurrency, 200),
+        "not_modified": await _throughput(
+            app, "/users/me", cookie + [(b"if-none-match", etag.encode())], total, concurrency, 304
+        ),
+    }
+    baseline = results["legacy"]["requests_per_sec"]
+    for result in results.values():
+        result["speedup_vs_legacy"] = round(result["requests_per_sec"] / baseline, 2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", help="записать JSON в файл")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _prepare_env(tmp)
+        result = {
+            "throughput": asyncio.run(run(args.requests, args.concurrency)),
+            "serialization_us": _serialization(20000),
+        }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
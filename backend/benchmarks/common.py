@@ -0,0 +1,72 @@
+"""Общие помощники бенчмарков: запуск сервера, нагрузка с заданной параллельностью, сводка латентностей."""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    total = len(latencies)
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "requests_per_sec": round(total / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / total * 1000, 2) if total else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if total else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if total else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if total else None,
+    }
+
+async def run_load(make_request, total: int, concurrency: int, ok_statuses=(200,)) -> dict:
+    """
+    Выполняет total вызовов make_request(i) -> httpx.Response,
+    не более concurrency одновременно. Ответ со статусом вне ok_statuses считается ошибкой.
+    """
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await make_request(i)
+                if response.status_code not in ok_statuses:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+def start_server(port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--backlog", "4096"],
+        cwd=BACKEND_DIR, env={**os.environ, **env},
+    )
+
+async def wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
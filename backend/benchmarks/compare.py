@@ -0,0 +1,44 @@
+"""
+Сравнивает два отчёта benchmarks.loadtest (или benchmarks.micro) и печатает изменения.
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+
+# Для этих метрик рост - это хорошо
+HIGHER_IS_BETTER = {"requests_per_sec", "calls_per_sec"}
+
+def flatten(data, prefix=""):
+    items = {}
+    for key, value in data.items():
+        if key == "meta":
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            items.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[path] = value
+    return items
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = flatten(json.load(f))
+    with open(args.after) as f:
+        after = flatten(json.load(f))
+
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        if old == new:
+            continue
+        change = (new - old) / old * 100 if old else float("inf")
+        better = (new > old) == (key.rsplit(".", 1)[-1] in HIGHER_IS_BETTER)
+        print(f"{key:55} {old:>12} -> {new:<12} {change:+8.1f}% {'better' if better else 'worse'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Воспроизводимый нагрузочный тест auth API.
+
+Сценарии: register, login, users_me, admin_verify. Для каждого считаются
+пропускная способность, p50/p95/p99 и доля ошибок; результат - JSON,
+который удобно сравнивать между коммитами (benchmarks/compare.py).
+
+Режимы:
+    --target inprocess   приложение в этом же процессе через ASGI-транспорт (по умолчанию)
+    --target spawn       отдельный процесс uvicorn на --port
+    --target http://...  уже запущенный сервер; нужны --email/--password
+                         существующего пользователя, admin_verify - с --admin-email
+                         (тот же --password) и --admin-password
+
+Для inprocess/spawn создаётся временная SQLite-база (или --url), миграции
+применяются, пользователи заводятся напрямую в БД, rate limit отключается.
+
+Запуск из каталога backend:
+    python -m benchmarks.loadtest --concurrency 50 --requests 2000 --output before.json
+    python -m benchmarks.loadtest --scenario users_me --scenario login --micro
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.common import BACKEND_DIR, run_load, start_server, wait_ready
+
+SCENARIOS = ["register", "login", "users_me", "admin_verify"]
+BENCH_PASSWORD = "BenchPass1"
+BENCH_EMAIL = "bench-user@example.com"
+ADMIN_EMAIL = "bench-admin@example.com"
+ADMIN_PASSWORD = "BenchAdmin1"
+
+def configure_environment(database_url: str):
+    # Настройки читаются при импорте модулей приложения - задаём их до импорта
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("DB_MIGRATE_ON_STARTUP", "false")
+
+def seed_database():
+    import auth
+    import migrate
+    import models
+    from database import SessionLocal, engine
+
+    migrate.upgrade()
+    with SessionLocal() as db:
+        for email, role, admin_password in ((BENCH_EMAIL, "user", None), (ADMIN_EMAIL, "admin", ADMIN_PASSWORD)):
+            if db.query(models.User).filter(models.User.email == email).first():
+                continue
+            db.add(models.User(
+                email=email, full_name="Bench", role=role, is_active=True,
+                hashed_password=auth.get_password_hash(BENCH_PASSWORD),
+                admin_password_hash=auth.get_password_hash(admin_password) if admin_password else None,
+            ))
+        db.commit()
+    engine.dispose()
+
+async def login_cookies(client: httpx.AsyncClient, email: str, password: str) -> dict:
+    response = await client.post("/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"access_token": response.cookies["access_token"]}
+
+async def run_scenarios(client: httpx.AsyncClient, args, admin_password) -> dict:
+    results = {}
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S%f")
+    user_cookies = await login_cookies(client, args.email, args.password)
+    admin_cookies = await login_cookies(client, args.admin_email, args.password) if admin_password else None
+
+    requests = {
+        "register": lambda i: client.post("/register", json={
+            "email": f"bench-{run_id}-{i}@example.com", "password": BENCH_PASSWORD, "full_name": "Bench",
+        }),
+        "login": lambda i: client.post("/login", json={"email": args.email, "password": args.password}),
+        "users_me": lambda i: client.get("/users/me", cookies=user_cookies),
+        "admin_verify": lambda i: client.post(
+            "/admin/verify-password", json={"password": admin_password}, cookies=admin_cookies
+        ),
+    }
+    for name in args.scenario or SCENARIOS:
+        if name == "admin_verify" and admin_cookies is None:
+            continue
+        results[name] = await run_load(requests[name], args.requests, args.concurrency)
+    return results
+
+async def run_inprocess(args) -> dict:
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await run_scenarios(client, args, ADMIN_PASSWORD)
+
+async def run_http(args, base_url: str, admin_password) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        return await run_scenarios(client, args, admin_password)
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="inprocess", help="inprocess | spawn | http://host:port")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="можно указать несколько раз")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000, help="запросов на сценарий")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--url", help="DATABASE_URL для inprocess/spawn; по умолчанию временная SQLite-база")
+    parser.add_argument("--email", default=BENCH_EMAIL)
+    parser.add_argument("--password", default=BENCH_PASSWORD)
+    parser.add_argument("--admin-email", default=ADMIN_EMAIL)
+    parser.add_argument("--admin-password", help="админ-пароль для внешнего сервера")
+    parser.add_argument("--micro", action="store_true", help="добавить микробенчмарки (benchmarks.micro)")
+    parser.add_argument("--output", help="записать JSON в файл")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.target.startswith("http"):
+            scenarios = asyncio.run(run_http(args, args.target.rstrip("/"), args.admin_password))
+        else:
+            database_url = args.url or f"sqlite:///{tmp}/loadtest.db"
+            configure_environment(database_url)
+            seed_database()
+            if args.target == "spawn":
+                server = start_server(args.port, {"DATABASE_URL": database_url, "RATE_LIMIT_ENABLED": "false"})
+                try:
+                    base_url = f"http://127.0.0.1:{args.port}"
+                    asyncio.run(wait_ready(base_url))
+                    scenarios = asyncio.run(run_http(args, base_url, ADMIN_PASSWORD))
+                finally:
+                    server.terminate()
+                    server.wait()
+            else:
+                scenarios = asyncio.run(run_inprocess(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.target,
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+        },
+        "scenarios": scenarios,
+    }
+    if args.micro:
+        from benchmarks import micro
+        report["micro"] = micro.run()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
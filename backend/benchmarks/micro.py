@@ -0,0 +1,63 @@
+"""
+Микробенчмарки горячего пути авторизации: выпуск и проверка JWT,
+сериализация schemas.User.
+
+*_jose - прежний путь через python-jose (для сравнения), jwt_decode_uncached -
+auth.TokenCodec без кеша, jwt_decode - auth.decode_token с кешем проверенных токенов.
+
+Запуск из каталога backend:
+    python -m benchmarks.micro
+    python -m benchmarks.micro --number 20000 --output micro.json
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+
+from jose import jwt
+
+import auth
+import models
+import schemas
+
+def _time(fn, number: int, repeat: int) -> dict:
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return {"us_per_call": round(best / number * 1e6, 3), "calls_per_sec": round(number / best)}
+
+def run(number: int = 10000, repeat: int = 5) -> dict:
+    claims = {"sub": "bench@example.com", "role": "user", "active": True}
+    token = auth.create_access_token(claims, expires_delta=timedelta(minutes=15))
+    db_user = models.User(
+        id=1, email="bench@example.com", full_name="Bench User", role="user",
+        is_active=True, created_at=datetime(2026, 1, 1), hashed_password="x",
+    )
+    user = schemas.User.model_validate(db_user)
+
+    jose_claims = dict(claims, type=auth.ACCESS_TOKEN_TYPE, exp=datetime.utcnow() + timedelta(minutes=15))
+
+    return {
+        "create_access_token_jose": _time(lambda: jwt.encode(jose_claims, auth.SECRET_KEY, algorithm=auth.ALGORITHM), number, repeat),
+        "create_access_token": _time(lambda: auth.create_access_token(claims, timedelta(minutes=15)), number, repeat),
+        "jwt_decode_jose": _time(lambda: jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]), number, repeat),
+        "jwt_decode_uncached": _time(lambda: auth.token_codec.decode(token), number, repeat),
+        "jwt_decode": _time(lambda: auth.decode_token(token), number, repeat),
+        "user_model_validate": _time(lambda: schemas.User.model_validate(db_user), number, repeat),
+        "user_model_dump_json": _time(lambda: user.model_dump_json(), number, repeat),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=10000, help="вызовов в одном замере")
+    parser.add_argument("--repeat", type=int, default=5, help="замеров; берётся лучший")
+    parser.add_argument("--output", help="записать JSON в файл")
+    args = parser.parse_args()
+
+    results = run(args.number, args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
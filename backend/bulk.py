@@ -0,0 +1,237 @@
+"""
+Массовый импорт и экспорт пользователей для администраторов.
+
+Импорт читает тело запроса потоком (CSV с заголовком email,password,full_name
+или NDJSON), проверяет строки через schemas.UserCreate, хеширует пароли
+в отдельном пуле процессов и вставляет пачками многострочными INSERT.
+Экспорт отдаёт таблицу users потоком, не загружая её в память целиком.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+from config import settings
+import asyncio
+import csv
+import io
+import json
+import os
+import threading
+import auth, crud, models, schemas, user_stats
+
+IMPORT_FORMATS = ("csv", "ndjson")
+CSV_COLUMNS = ("email", "password", "full_name")
+EXPORT_COLUMNS = (
+    models.User.id,
+    models.User.email,
+    models.User.full_name,
+    models.User.role,
+    models.User.is_active,
+    models.User.created_at,
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    # Отдельный пул: массовый импорт не должен занимать auth.password_hasher,
+    # через который идут интерактивные /login и /register
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.BULK_HASH_WORKERS or os.cpu_count() or 1)
+        return _executor
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+async def _lines(stream):
+    # Режем только новый чанк; от прошлых остаётся лишь хвост незавершённой строки,
+    # иначе длинная строка без \n копировалась бы заново на каждом чанке
+    partial = []
+    async for chunk in stream:
+        *lines, tail = chunk.split(b"\n")
+        if lines:
+            partial.append(lines[0])
+            lines[0] = b"".join(partial)
+            partial = []
+        if tail:
+            partial.append(tail)
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if partial:
+        yield b"".join(partial).decode("utf-8-sig").rstrip("\r")
+
+async def parse_rows(stream, fmt: str):
+    """Выдаёт (номер строки, dict | None, ошибка разбора | None)."""
+    header = None
+    line_no = 0
+    async for line in _lines(stream):
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_no, None, "Expected a JSON object"
+                continue
+            yield line_no, row, None
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [value.strip().lower() for value in values]
+            missing = {"email", "password"} - set(header)
+            if missing:
+                raise ValueError(f"CSV header must contain {', '.join(CSV_COLUMNS)}")
+            continue
+        yield line_no, dict(zip(header, values)), None
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+def _existing_emails(db, emails) -> set:
+    """Уже занятые адреса в нормализованном виде (без учёта регистра)."""
+    return set(db.scalars(
+        select(models.User.email_normalized).where(models.User.email_normalized.in_(emails))
+    ))
+
+def _insert_error_message(error) -> str:
+    """Текст ошибки строки импорта: нарушение уникальности email или исходная причина из БД."""
+    message = str(error.orig)
+    lowered = message.lower()
+    # SQLite: "UNIQUE constraint failed: users.email"; MySQL 1062: "Duplicate entry ... for key 'ix_users_email'"
+    if ("unique" in lowered or "duplicate entry" in lowered) and "email" in lowered:
+        return "Email already registered"
+    return f"Database error: {message}"
+
+def _insert_chunk(db, rows: list) -> list:
+    """
+    Вставляет пачку одним многострочным INSERT. Если пачка упала (пользователь
+    появился параллельно, недопустимое значение), повторяет построчно и возвращает ошибки.
+    """
+    existing = _existing_emails(db, [row["email_normalized"] for row in rows])
+    errors = [
+        (row["_line"], row["email"], "Email already registered") for row in rows if row["email_normalized"] in existing
+    ]
+    rows = [row for row in rows if row["email_normalized"] not in existing]
+    values = [{k: v for k, v in row.items() if k != "_line"} for row in rows]
+    if not values:
+        return errors
+    try:
+        db.execute(insert(models.User), values)
+        # Пакетный INSERT не вызывает ORM-событий - счётчики /admin/stats обновляем сами
+        user_stats.record_inserted_rows(db.connection(), values)
+        db.commit()
+        return errors
+    except (IntegrityError, DataError):
+        db.rollback()
+
+    for row, value in zip(rows, values):
+        try:
+            db.execute(insert(models.User), [value])
+            user_stats.record_inserted_rows(db.connection(), [value])
+            db.commit()
+        except (IntegrityError, DataError) as e:
+            db.rollback()
+            errors.append((row["_line"], row["email"], _insert_error_message(e)))
+    return errors
+
+async def _flush(db, chunk: list, result: dict):
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    hashes = await asyncio.gather(*[
+        loop.run_in_executor(executor, auth.get_password_hash, user.password) for _, user in chunk
+    ])
+    rows = [
+        {
+            "_line": line_no,
+            "email": user.email,
+            "email_normalized": models.normalize_email(user.email),
+            "full_name": user.full_name,
+            "hashed_password": hashed_password,
+            "role": models.User.ROLE_USER,
+            "is_active": True,
+        }
+        for (line_no, user), hashed_password in zip(chunk, hashes)
+    ]
+    errors = await crud.run_sync(db, _insert_chunk, rows)
+    result["created"] += len(rows) - len(errors)
+    for error in errors:
+        _add_error(result, *error)
+
+def _add_error(result: dict, line_no: int, email, message: str):
+    result["failed"] += 1
+    if len(result["errors"]) < settings.BULK_IMPORT_MAX_ERRORS:
+        result["errors"].append({"line": line_no, "email": email, "error": message})
+
+async def import_users(db, stream, fmt: str) -> dict:
+    result = {"created": 0, "failed": 0, "errors": []}
+    chunk, seen = [], set()
+    async for line_no, row, parse_error in parse_rows(stream, fmt):
+        if parse_error:
+            _add_error(result, line_no, None, parse_error)
+            continue
+        try:
+            user = schemas.UserCreate(**{key: row.get(key) or None for key in CSV_COLUMNS})
+        except ValidationError as e:
+            _add_error(result, line_no, row.get("email"), _validation_message(e))
+            continue
+        email_key = models.normalize_email(user.email)
+        if email_key in seen:
+            _add_error(result, line_no, user.email, "Duplicate email in file")
+            continue
+        seen.add(email_key)
+        chunk.append((line_no, user))
+        if len(chunk) >= settings.BULK_IMPORT_CHUNK_SIZE:
+            await _flush(db, chunk, result)
+            chunk = []
+    if chunk:
+        await _flush(db, chunk, result)
+    return result
+
+def _export_chunk(rows, fmt: str) -> str:
+    # Одна порция ответа на пачку yield_per: построчная отдача стоила бы
+    # переход в threadpool и ASGI send на каждую строку
+    if fmt == "ndjson":
+        return "".join(json.dumps(dict(row._mapping), default=str, ensure_ascii=False) + "\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+def _export_header(fmt: str) -> str:
+    if fmt == "ndjson":
+        return ""
+    return ",".join(column.key for column in EXPORT_COLUMNS) + "\r\n"
+
+def _export_statement():
+    return select(*EXPORT_COLUMNS).order_by(models.User.id).execution_options(yield_per=settings.BULK_EXPORT_BATCH_SIZE)
+
+def export_users_sync(fmt: str):
+    # Своя сессия: генератор работает, пока отдаётся ответ, дольше зависимости get_session
+    from database import SessionLocal
+
+    yield _export_header(fmt)
+    with SessionLocal() as db:
+        for rows in db.execute(_export_statement()).partitions():
+            yield _export_chunk(rows, fmt)
+
+async def export_users_async(fmt: str):
+    from database import AsyncSessionLocal
+
+    yield _export_header(fmt)
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(_export_statement())
+        async for rows in result.partitions():
+            yield _export_chunk(rows, fmt)
+
+def export_users(fmt: str):
+    return export_users_async(fmt) if settings.DB_ASYNC else export_users_sync(fmt)
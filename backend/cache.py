@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from config import settings
+from singleflight import user_lookups
+import threading
+import time
+import metrics
+import models
+
+class TTLCache:
+    """
+    Ограниченный LRU-кеш с временем жизни записей. Потокобезопасный:
+    синхронные зависимости FastAPI выполняются в threadpool.
+    stale_seconds: сколько истёкшая запись ещё хранится для get_stale().
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, stale_seconds: float = 0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None and entry[0] + self.stale_seconds <= now:
+                    del self._data[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, key):
+        """Значение, даже если TTL истёк, но не старше ttl + stale_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] + self.stale_seconds <= now:
+                return None
+            self.stale_hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl_seconds: float = None):
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+# Кеш авторизованных пользователей для get_current_user: email -> dict полей schemas.User.
+# Кеш локален для процесса, поэтому при нескольких воркерах устаревание ограничено TTL.
+# Истёкшие записи ещё USER_CACHE_STALE_SECONDS отдаются, пока БД недоступна (circuit breaker).
+user_cache = TTLCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_STALE_SECONDS)
+
+@metrics.register_collector
+def _user_cache_metrics():
+    stats = user_cache.stats()
+    yield "user_cache_entries", "gauge", "Entries in the authenticated user cache", {}, stats["size"]
+    for event_name in ("hits", "misses", "stale_hits", "evictions", "invalidations"):
+        yield "user_cache_events_total", "counter", "User cache lookups and removals", {"event": event_name}, stats[event_name]
+
+def invalidate_user(email: str):
+    if email:
+        user_cache.invalidate(email)
+        # Поиск, начатый до изменения, не должен достаться новым запросам
+        user_lookups.forget(email)
+
+# Любое изменение строки пользователя через ORM (роль, is_active, хеши паролей)
+# сбрасывает запись. Crud-функции дополнительно сбрасывают её после commit.
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_user(target.email)
+    for old_email in inspect(target).attrs.email.history.deleted:
+        invalidate_user(old_email)
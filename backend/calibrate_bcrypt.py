@@ -0,0 +1,56 @@
+"""
+Подбирает стоимость bcrypt под процессор этого хоста.
+
+    python calibrate_bcrypt.py                  # бюджет из BCRYPT_TARGET_MS
+    python calibrate_bcrypt.py --target-ms 100  # свой бюджет на один хеш
+
+Выбирается максимальное число раундов, при котором медиана времени хеширования
+укладывается в бюджет. Результат нужно записать в .env как BCRYPT_ROUNDS;
+существующие хеши обновятся при следующем входе пользователей.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from passlib.hash import bcrypt
+
+from config import settings
+
+MIN_ROUNDS, MAX_ROUNDS = 4, 20
+SAMPLE_PASSWORD = "Calibration1"
+
+def measure(rounds: int, samples: int) -> float:
+    """Медиана времени одного хеша в миллисекундах."""
+    hasher = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hasher.hash(SAMPLE_PASSWORD)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def calibrate(target_ms: float, samples: int = 3, verbose: bool = True) -> int:
+    chosen = MIN_ROUNDS
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        elapsed = measure(rounds, samples)
+        if verbose:
+            print(f"rounds={rounds:2d}  {elapsed:9.1f} ms")
+        if elapsed > target_ms:
+            break
+        chosen = rounds
+    return chosen
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=settings.BCRYPT_TARGET_MS, help="бюджет на один хеш, мс")
+    parser.add_argument("--samples", type=int, default=3, help="замеров на каждое значение раундов")
+    args = parser.parse_args()
+
+    rounds = calibrate(args.target_ms, args.samples)
+    if rounds < 10:
+        print(f"warning: {rounds} rounds is below the usual minimum of 10 - consider a larger budget", file=sys.stderr)
+    print(f"\nBCRYPT_ROUNDS={rounds}  (current: {settings.BCRYPT_ROUNDS}, target {args.target_ms:g} ms)")
+
+if __name__ == "__main__":
+    sys.exit(main())
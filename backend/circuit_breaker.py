@@ -0,0 +1,120 @@
+"""
+Circuit breaker для основной базы.
+
+closed    - запросы идут в БД; ошибки соединения и таймауты считаются подряд.
+open      - после DB_BREAKER_FAILURE_THRESHOLD ошибок запросы сразу получают
+            DatabaseUnavailable, не дожидаясь таймаутов зависшего сервера.
+half_open - через DB_BREAKER_RESET_SECONDS пропускается до
+            DB_BREAKER_HALF_OPEN_MAX_CALLS пробных запросов: успех закрывает
+            breaker, ошибка снова открывает его.
+
+Модуль не зависит от остального приложения. database подключает его в двух
+местах: before_call - перед запросом сессии, до получения соединения из пула
+(иначе при зависшем сервере ждём connect и pre-ping), check - на каждом
+запросе движка, включая фоновые соединения без сессии.
+"""
+import threading
+import time
+import metrics
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+class DatabaseUnavailable(Exception):
+    """База недоступна (breaker открыт) - запрос отклонён без обращения к ней."""
+
+    def __init__(self, retry_after: float = 1):
+        super().__init__("Database circuit breaker is open")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float, half_open_max_calls: int = 1,
+                 enabled: bool = True):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.enabled = enabled
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.rejected = 0
+        self._half_open_calls = 0
+        self._half_open_since = None
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            metrics.DB_BREAKER_TRANSITIONS.inc(self.name, state)
+
+    def _reject(self, now: float):
+        # Вызывается под self._lock
+        self.rejected += 1
+        return DatabaseUnavailable(max(1.0, self.reset_seconds - (now - self.opened_at)))
+
+    def before_call(self):
+        """Бросает DatabaseUnavailable, если запрос сейчас выполнять нельзя. В half-open занимает пробный слот."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == STATE_OPEN and now - self.opened_at >= self.reset_seconds:
+                self._transition(STATE_HALF_OPEN)
+                self._half_open_calls, self._half_open_since = 0, now
+            if self.state == STATE_HALF_OPEN and now - self._half_open_since >= self.reset_seconds:
+                # Пробный запрос так и не вернул результата - пропускаем следующий
+                self._half_open_calls, self._half_open_since = 0, now
+            if self.state == STATE_HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return
+            error = self._reject(now)
+        metrics.DB_BREAKER_REJECTIONS.inc(self.name)
+        raise error
+
+    def check(self):
+        """Как before_call, но без пробного слота: отклоняет, только пока breaker открыт и reset не истёк."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state != STATE_OPEN:
+                return
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_seconds:
+                return
+            error = self._reject(now)
+        metrics.DB_BREAKER_REJECTIONS.inc(self.name)
+        raise error
+
+    def record_success(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state != STATE_CLOSED:
+                self._transition(STATE_CLOSED)
+                self.opened_at = None
+
+    def record_failure(self, error: Exception = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._transition(STATE_OPEN)
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.opened_at else None,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
@@ -10,11 +10,147 @@ class Settings(BaseSettings):
     # Security
     SECRET_KEY: str = "your-secret-key-change-it" # Override in .env
     ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Short-lived access token: role/is_active claims are trusted until it expires
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    # Rotating refresh token (cookie), checked against the database on /refresh
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 1
+    REFRESH_TOKEN_REMEMBER_ME_DAYS: int = 30
+    REFRESH_TOKEN_PURGE_INTERVAL_SECONDS: int = 3600 # background deletion of expired refresh tokens; 0 = disabled
+
+    # Password hashing pool (bcrypt runs outside the FastAPI threadpool)
+    PASSWORD_HASH_EXECUTOR: str = "thread" # thread | process
+    PASSWORD_HASH_WORKERS: int = 0 # 0 = number of CPU cores
+    PASSWORD_HASH_MAX_QUEUE: int = 32 # waiting jobs above the workers; beyond that requests get 503
+
+    # bcrypt cost. Pick BCRYPT_ROUNDS per host with `python calibrate_bcrypt.py`.
+    # Hashes outside [MIN, MAX] are rehashed with BCRYPT_ROUNDS after a successful login
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_MIN_ROUNDS: int = 0 # 0 = BCRYPT_ROUNDS
+    BCRYPT_MAX_ROUNDS: int = 0 # 0 = BCRYPT_ROUNDS
+    BCRYPT_TARGET_MS: int = 250 # latency budget for one hash used by the calibration
     
     # Database
     DATABASE_URL: str = "sqlite:///./sql_app.db"
+
+    # Database connection pool
+    # DB_POOL_MODE: "queue" - persistent pool of connections, "null" - new connection per request (old behaviour)
+    DB_POOL_MODE: str = "queue"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30 # seconds to wait for a free connection from the pool
+    DB_POOL_RECYCLE: int = 280 # seconds; keep below MySQL wait_timeout on the remote server
+    DB_POOL_PRE_PING: bool = True
+
+    # Async data path (aiomysql for MySQL, aiosqlite for SQLite); False keeps the sync Session path
+    DB_ASYNC: bool = False
+
+    # In-process cache of authenticated users (get_current_user)
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_STALE_SECONDS: int = 300 # expired entries may still be served this long while the DB is unavailable
+    USER_LOOKUP_SINGLE_FLIGHT: bool = True # concurrent get_current_user lookups for one email share a single query
+
+    # In-process cache of verified JWTs (sha256 of token -> claims); entries never outlive "exp"
+    TOKEN_CACHE_ENABLED: bool = True
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 60
+
+    # Read replicas: comma-separated URLs in the DATABASE_URL format. Authenticated reads
+    # (get_current_user, /admin/users) go round-robin to healthy replicas; a user is read
+    # from the primary for REPLICA_READ_YOUR_WRITES_SECONDS after their row changes
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_READ_YOUR_WRITES_SECONDS: int = 5
+
+    # Schema migrations normally run as a separate step: `python migrate.py`.
+    # When enabled, serve.py applies them once before starting workers
+    # (or the startup hook does, if the app is run with plain uvicorn)
+    DB_MIGRATE_ON_STARTUP: bool = False
+
+    # Background DB reachability check behind /health/ready
+    HEALTH_CHECK_INTERVAL_SECONDS: float = 5
+
+    # Per-connection timeouts (MySQL only). Read/write bound a hung server;
+    # slow queries are cut earlier by DB_STATEMENT_TIMEOUT_MS
+    DB_CONNECT_TIMEOUT: int = 5
+    DB_READ_TIMEOUT: int = 15
+    DB_WRITE_TIMEOUT: int = 15
+    DB_STATEMENT_TIMEOUT_MS: int = 5000 # MySQL MAX_EXECUTION_TIME (SELECT), SQLite progress handler; 0 = off
+
+    # Circuit breaker around the primary database: opens after N consecutive connection
+    # errors/timeouts, rejects queries at once while open, then lets probe queries through
+    DB_BREAKER_ENABLED: bool = True
+    DB_BREAKER_FAILURE_THRESHOLD: int = 5
+    DB_BREAKER_RESET_SECONDS: int = 10 # open -> half-open
+    DB_BREAKER_HALF_OPEN_MAX_CALLS: int = 1
     
+    # Bulk user import/export (/admin/users/import, /admin/users/export)
+    BULK_IMPORT_CHUNK_SIZE: int = 500 # rows per multi-row INSERT
+    BULK_IMPORT_MAX_ERRORS: int = 1000 # per-row errors returned in the response
+    BULK_HASH_WORKERS: int = 0 # bcrypt processes for imports; 0 = number of CPU cores
+    BULK_EXPORT_BATCH_SIZE: int = 1000 # rows fetched per round-trip while streaming
+
+    # Rate limiting (one shared limiter, see rate_limit.py)
+    # Storage: memory:// (per process), sqlite:///./ratelimit.db (shared by all workers on one host),
+    # redis://host:6379 (shared across hosts, needs the `redis` package)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORAGE_URI: str = "memory://" # serve.py switches memory:// to sqlite when SERVER_WORKERS > 1
+    RATE_LIMIT_STRATEGY: str = "sliding-window-counter" # fixed-window | moving-window | sliding-window-counter
+    RATE_LIMIT_LOGIN: str = "5/minute"
+    RATE_LIMIT_REGISTER: str = "5/minute"
+    RATE_LIMIT_REFRESH: str = "30/minute"
+
+    # Adaptive load shedding (admission.py): at most `limit` requests in flight, the rest get 503.
+    # The limit grows while responses are faster than the target and shrinks (x BACKOFF) otherwise
+    LOAD_SHED_ENABLED: bool = True
+    LOAD_SHED_INITIAL_LIMIT: int = 64
+    LOAD_SHED_MIN_LIMIT: int = 4
+    LOAD_SHED_MAX_LIMIT: int = 512
+    LOAD_SHED_TARGET_LATENCY_MS: int = 1000
+    LOAD_SHED_BACKOFF: float = 0.9
+    LOAD_SHED_RETRY_AFTER_SECONDS: int = 1
+
+    # Auth audit log: events are queued in memory and inserted in batches by a background thread
+    AUDIT_ENABLED: bool = True
+    AUDIT_QUEUE_SIZE: int = 10000 # events waiting for the writer; beyond that the drop policy applies
+    AUDIT_DROP_POLICY: str = "drop_new" # drop_new | drop_oldest
+    AUDIT_BATCH_SIZE: int = 500 # rows per multi-row INSERT
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = 1.0 # max delay before a partial batch is written
+    AUDIT_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0
+
+    # /admin/stats: counters in user_stats are updated with every users write,
+    # a background job recounts them from users to repair drift (0 = disabled)
+    USER_STATS_CACHE_TTL_SECONDS: int = 30
+    USER_STATS_RECONCILE_INTERVAL_SECONDS: int = 3600
+    USER_STATS_MAX_DAYS: int = 365 # longest signups-per-day window the endpoint returns
+
+    # Per-account login lockout, checked before bcrypt. After LOGIN_LOCKOUT_THRESHOLD failures
+    # the account is locked for BASE * 2^(n - threshold) seconds, up to MAX
+    LOGIN_LOCKOUT_ENABLED: bool = True
+    LOGIN_LOCKOUT_STORAGE_URI: str = "" # empty = RATE_LIMIT_STORAGE_URI
+    LOGIN_LOCKOUT_THRESHOLD: int = 5
+    LOGIN_LOCKOUT_BASE_SECONDS: int = 1
+    LOGIN_LOCKOUT_MAX_SECONDS: int = 900
+    LOGIN_FAILURE_WINDOW_SECONDS: int = 3600 # failure counter resets this long after the first failure
+
+    # Server (python serve.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0 # 0 = number of CPU cores
+    SERVER_LOOP: str = "auto" # auto (uvloop if installed) | uvloop | asyncio
+    SERVER_HTTP: str = "auto" # auto (httptools if installed) | httptools | h11
+    SERVER_THREADPOOL_SIZE: int = 40 # threads for sync endpoints and dependencies, per worker
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    SERVER_BACKLOG: int = 2048
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30 # time to drain in-flight requests on SIGTERM
+    SERVER_LIMIT_CONCURRENCY: int = 0 # 0 = unlimited; above it uvicorn answers 503
+
+    # Observability
+    METRICS_ENABLED: bool = True # Prometheus text format on /metrics
+    LOG_FORMAT: str = "text" # text | json
+    LOG_LEVEL: str = "INFO"
+    LOG_REQUESTS: bool = False # one log line per request (route, status, duration, DB time)
+
     # CORS
     # In .env, this can be a comma-separated string: "http://localhost:5173,https://myapp.com"
     CORS_ORIGINS: str = "http://localhost:5173,http://127.0.0.1:5173"
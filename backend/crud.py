@@ -1,11 +1,100 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, bindparam, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from config import settings
 import models, schemas, auth
+import database
+import metrics
+import replicas
+from cache import invalidate_user
+import base64
+import json
+import logging
+
+logger = logging.getLogger("app")
+
+# Запросы собираются один раз при импорте; скомпилированный SQL кешируется движком
+# (compiled cache), так что на горячем пути остаются только привязка email и выполнение.
+# Точный email - для subject токенов и сессий: в токен всегда пишется email из БД.
+# Без учёта регистра (индексированная users.email_normalized) - только для ввода
+# пользователя: вход и проверка занятости адреса при регистрации.
+_by_email = models.User.email == bindparam("email")
+_by_normalized_email = models.User.email_normalized == bindparam("email")
+
+# Полная ORM-сущность: для кода, который меняет пользователя через сессию
+USER_BY_EMAIL = select(models.User).where(_by_email).limit(1)
+# Проверка существования при регистрации
+USER_ID_BY_EMAIL = select(models.User.id).where(_by_normalized_email).limit(1)
+# Авторизация и /users/me: поля schemas.User, без хешей паролей
+AUTH_USER_BY_EMAIL = select(
+    models.User.id,
+    models.User.email,
+    models.User.full_name,
+    models.User.role,
+    models.User.is_active,
+    models.User.created_at,
+).where(_by_email).limit(1)
+# Только для /login. Без limit: адреса, отличающиеся регистром, могли остаться
+# с тех пор, как email сравнивался точно (миграция 0004 их не объединяет)
+CREDENTIALS_BY_EMAIL = select(
+    models.User.id,
+    models.User.email,
+    models.User.hashed_password,
+    models.User.role,
+    models.User.is_active,
+).where(_by_normalized_email)
+# Только для /admin/verify-password
+ADMIN_CREDENTIALS_BY_EMAIL = select(
+    models.User.id,
+    models.User.email,
+    models.User.admin_password_hash,
+).where(_by_email).limit(1)
+
+def _email_params(email: str) -> dict:
+    return {"email": email}
+
+def _normalized_email_params(email: str) -> dict:
+    return {"email": models.normalize_email(email)}
+
+def _pick_credentials(rows, email: str):
+    """
+    Учётная запись для входа: единственное совпадение без учёта регистра или
+    точное совпадение среди нескольких. Иначе вход закрыт (None): нельзя
+    впустить в один из аккаунтов, различающихся только регистром, наугад.
+    """
+    if len(rows) == 1:
+        return rows[0]
+    exact = [row for row in rows if row.email == email]
+    if len(exact) == 1:
+        return exact[0]
+    if rows:
+        logger.warning("Ambiguous login email", extra={"matches": len(rows)})
+    return None
 
 def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+    return db.scalars(USER_BY_EMAIL, _email_params(email)).first()
+
+def email_exists(db: Session, email: str) -> bool:
+    return db.execute(USER_ID_BY_EMAIL, _normalized_email_params(email)).first() is not None
+
+def get_auth_user(db: Session, email: str):
+    """Row(id, email, full_name, role, is_active, created_at) или None; email - точный, из токена."""
+    return db.execute(AUTH_USER_BY_EMAIL, _email_params(email)).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+def get_user_credentials(db: Session, email: str):
+    """Row(id, email, hashed_password, role, is_active) или None; email - как ввёл пользователь."""
+    return _pick_credentials(db.execute(CREDENTIALS_BY_EMAIL, _normalized_email_params(email)).all(), email)
+
+def get_admin_credentials(db: Session, email: str):
+    """Row(id, email, admin_password_hash) или None; email - точный, из токена."""
+    return db.execute(ADMIN_CREDENTIALS_BY_EMAIL, _email_params(email)).first()
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str = None):
+    # Хеш можно посчитать заранее в пуле auth.password_hasher
+    if hashed_password is None:
+        hashed_password = auth.get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -15,3 +104,282 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.commit()
     db.refresh(db_user)
     return db_user
+
+def set_admin_password_hash(db: Session, user_id: int, email: str, hashed_password: str):
+    db.execute(update(models.User).where(models.User.id == user_id).values(admin_password_hash=hashed_password))
+    db.commit()
+    # UPDATE без ORM не вызывает слушателей модели - сбрасываем кеш и отмечаем запись явно
+    invalidate_user(email)
+    replicas.mark_user_written(email)
+
+USER_LIST_COLUMNS = (
+    models.User.id,
+    models.User.email,
+    models.User.full_name,
+    models.User.role,
+    models.User.is_active,
+    models.User.created_at,
+)
+
+def encode_user_cursor(created_at: datetime, user_id: int) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, user_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_user_cursor(cursor: str):
+    """Возвращает (created_at, id); ValueError, если курсор повреждён."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, user_id = json.loads(raw)
+        return (datetime.fromisoformat(created_at) if created_at else None), int(user_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def list_users(
+    db: Session,
+    limit: int = 50,
+    cursor: str = None,
+    role: str = None,
+    is_active: bool = None,
+    email_prefix: str = None,
+    name_prefix: str = None,
+):
+    """
+    Страница пользователей, новые первыми. Keyset по (created_at, id) вместо OFFSET:
+    стоимость не зависит от номера страницы. Возвращает (строки, next_cursor).
+    """
+    query = select(*USER_LIST_COLUMNS)
+    if role is not None:
+        query = query.where(models.User.role == role)
+    if is_active is not None:
+        query = query.where(models.User.is_active == is_active)
+    if email_prefix:
+        query = query.where(models.User.email.startswith(email_prefix, autoescape=True))
+    if name_prefix:
+        query = query.where(models.User.full_name.startswith(name_prefix, autoescape=True))
+    if cursor:
+        created_at, user_id = decode_user_cursor(cursor)
+        # Раскрытое сравнение кортежей: оба диалекта превращают его в range scan по индексу
+        query = query.where(or_(
+            models.User.created_at < created_at,
+            and_(models.User.created_at == created_at, models.User.id < user_id),
+        ))
+    query = query.order_by(models.User.created_at.desc(), models.User.id.desc()).limit(limit + 1)
+
+    rows = db.execute(query).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_user_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+PASSWORD_HASH_FIELDS = ("hashed_password", "admin_password_hash")
+
+def replace_password_hash(db: Session, user_id: int, field: str, old_hash: str, new_hash: str) -> bool:
+    # Условие на старый хеш: пароль, сменённый за это время, не перезаписываем
+    column = getattr(models.User, field)
+    result = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id, column == old_hash)
+        .values({field: new_hash})
+    )
+    db.commit()
+    return result.rowcount == 1
+
+async def rehash_password(user_id: int, field: str, old_hash: str, password: str):
+    """
+    Фоновая задача после успешной проверки: пересчитывает хеш с текущей
+    стоимостью bcrypt. Открывает свою сессию - сессия запроса к этому моменту закрыта.
+    """
+    if field not in PASSWORD_HASH_FIELDS:
+        raise ValueError(f"Unknown password field: {field}")
+    try:
+        new_hash = await auth.get_password_hash_async(password)
+    except auth.PasswordHashingBusy:
+        # Пул занят интерактивными запросами - обновим при следующем входе
+        metrics.PASSWORD_REHASHES.inc(field, "skipped")
+        return
+    try:
+        if settings.DB_ASYNC:
+            async with database.AsyncSessionLocal() as db:
+                updated = await run_sync(db, replace_password_hash, user_id, field, old_hash, new_hash)
+        else:
+            with database.SessionLocal() as db:
+                updated = await run_in_threadpool(replace_password_hash, db, user_id, field, old_hash, new_hash)
+    except Exception:
+        logger.exception("Password rehash failed", extra={"user_id": user_id, "field": field})
+        metrics.PASSWORD_REHASHES.inc(field, "error")
+        return
+    metrics.PASSWORD_REHASHES.inc(field, "updated" if updated else "conflict")
+
+def issue_refresh_token(db: Session, user_id: int, jti: str, expires_at: datetime, remember_me: bool = False):
+    db.add(models.RefreshToken(user_id=user_id, jti=jti, expires_at=expires_at, remember_me=remember_me))
+    db.commit()
+
+def rotate_refresh_token(db: Session, jti: str, new_jti: str):
+    """
+    Обменивает действующий refresh-токен на новый и возвращает (schemas.User, remember_me).
+    Повторное предъявление уже заменённого токена означает его утечку -
+    отзываются все refresh-токены пользователя. При любой ошибке возвращает (None, False).
+    """
+    now = datetime.utcnow()
+    record = db.execute(
+        select(
+            models.RefreshToken.user_id,
+            models.RefreshToken.remember_me,
+            models.RefreshToken.expires_at,
+            models.RefreshToken.revoked_at,
+        ).where(models.RefreshToken.jti == jti)
+    ).first()
+    if record is None:
+        return None, False
+    if record.revoked_at is not None:
+        revoke_user_refresh_tokens(db, record.user_id)
+        return None, False
+    if record.expires_at <= now:
+        return None, False
+
+    db_user = db.get(models.User, record.user_id)
+    if db_user is None or not db_user.is_active:
+        return None, False
+
+    # Снимок до commit: после него атрибуты ORM истекают
+    current_user, remember_me = schemas.User.model_validate(db_user), record.remember_me
+    # Отзыв - условный UPDATE: из двух одновременных /refresh с одним jti
+    # токен получает только один, второй видит rowcount 0 и считается повтором
+    result = db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.jti == jti, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now, replaced_by=new_jti)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        revoke_user_refresh_tokens(db, record.user_id)
+        return None, False
+    db.add(models.RefreshToken(
+        user_id=current_user.id, jti=new_jti, remember_me=remember_me,
+        expires_at=now + timedelta(days=auth.refresh_token_days(remember_me)),
+    ))
+    db.commit()
+    return current_user, remember_me
+
+def revoke_refresh_token(db: Session, jti: str):
+    db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.jti == jti, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+    db.commit()
+
+def revoke_user_refresh_tokens(db: Session, user_id: int):
+    now = datetime.utcnow()
+    db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.user_id == user_id, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    # Истёкшие строки не нужны и для обнаружения повтора: JWT с их jti уже не проходит проверку exp
+    db.execute(
+        delete(models.RefreshToken)
+        .where(models.RefreshToken.user_id == user_id, models.RefreshToken.expires_at <= now)
+    )
+    db.commit()
+
+def purge_expired_refresh_tokens(db: Session, batch_size: int = 1000) -> int:
+    """
+    Удаляет истёкшие refresh-токены пачками по batch_size (каждая в своей
+    транзакции, без долгих блокировок). Отозванные, но не истёкшие строки
+    остаются: по ним /refresh распознаёт повторное предъявление.
+    """
+    deleted = 0
+    while True:
+        ids = db.scalars(
+            select(models.RefreshToken.id)
+            .where(models.RefreshToken.expires_at <= datetime.utcnow())
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            return deleted
+        db.execute(delete(models.RefreshToken).where(models.RefreshToken.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+
+# Асинхронные варианты для обработчиков: принимают AsyncSession (DB_ASYNC=true)
+# или обычную Session - тогда синхронный вызов уходит в threadpool.
+
+async def _rows(db, statement, params: dict):
+    if isinstance(db, AsyncSession):
+        return (await db.execute(statement, params)).all()
+    return await run_in_threadpool(lambda: db.execute(statement, params).all())
+
+async def _first_row(db, statement, params: dict):
+    rows = await _rows(db, statement, params)
+    return rows[0] if rows else None
+
+async def get_user_by_email_async(db, email: str):
+    if isinstance(db, AsyncSession):
+        return (await db.scalars(USER_BY_EMAIL, _email_params(email))).first()
+    return await run_in_threadpool(get_user_by_email, db, email)
+
+async def email_exists_async(db, email: str) -> bool:
+    return await _first_row(db, USER_ID_BY_EMAIL, _normalized_email_params(email)) is not None
+
+async def get_auth_user_async(db, email: str):
+    return await _first_row(db, AUTH_USER_BY_EMAIL, _email_params(email))
+
+async def get_user_credentials_async(db, email: str):
+    return _pick_credentials(await _rows(db, CREDENTIALS_BY_EMAIL, _normalized_email_params(email)), email)
+
+async def get_admin_credentials_async(db, email: str):
+    return await _first_row(db, ADMIN_CREDENTIALS_BY_EMAIL, _email_params(email))
+
+async def get_auth_user_read_async(db, email: str):
+    """
+    Чтение с реплики; если строки там ещё нет (создана только что, возможно
+    в другом воркере) - повторяем в основной базе.
+    """
+    row = await get_auth_user_async(db, email)
+    if row is None and replicas.is_replica_session(db):
+        metrics.DB_READ_ROUTING.inc("primary", "not_found_on_replica")
+        async with replicas.primary_session() as primary:
+            row = await get_auth_user_async(primary, email)
+    return row
+
+async def create_user_async(db, user: schemas.UserCreate):
+    hashed_password = await auth.get_password_hash_async(user.password)
+    if not isinstance(db, AsyncSession):
+        return await run_in_threadpool(create_user, db, user, hashed_password)
+    db_user = models.User(
+        email=user.email,
+        hashed_password=hashed_password,
+        full_name=user.full_name
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def set_admin_password_hash_async(db, user_id: int, email: str, hashed_password: str):
+    return await run_sync(db, set_admin_password_hash, user_id, email, hashed_password)
+
+async def run_sync(db, fn, *args):
+    """
+    Вызывает синхронную fn(session, *args) для любой сессии: многошаговые
+    операции пишутся один раз, AsyncSession.run_sync выполняет их поверх
+    асинхронного соединения, обычная Session - в threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+async def list_users_async(db, limit: int = 50, cursor: str = None, role: str = None,
+                           is_active: bool = None, email_prefix: str = None, name_prefix: str = None):
+    return await run_sync(db, list_users, limit, cursor, role, is_active, email_prefix, name_prefix)
+
+async def issue_refresh_token_async(db, user_id: int, jti: str, expires_at: datetime, remember_me: bool = False):
+    return await run_sync(db, issue_refresh_token, user_id, jti, expires_at, remember_me)
+
+async def rotate_refresh_token_async(db, jti: str, new_jti: str):
+    return await run_sync(db, rotate_refresh_token, jti, new_jti)
+
+async def revoke_refresh_token_async(db, jti: str):
+    return await run_sync(db, revoke_refresh_token, jti)
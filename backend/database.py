@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
 import os
+import sqlite3
+import time
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -10,22 +14,191 @@ from pathlib import Path
 env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-# Используем NullPool - создаёт новое соединение для каждого запроса
-# Это более надёжно для удалённых серверов с ограничениями
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=NullPool,  # Без пула - новое соединение каждый раз
-    connect_args={
-        "connect_timeout": 30,
-        "read_timeout": 60,
-        "write_timeout": 60,
-        "charset": "utf8mb4"
-    }
-)
+from config import settings
+from circuit_breaker import CircuitBreaker
+import metrics
+
+DATABASE_URL = os.getenv("DATABASE_URL") or settings.DATABASE_URL
+
+# Асинхронные драйверы для тех же баз
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+}
+
+def async_database_url(url: str) -> str:
+    """mysql+pymysql://... -> mysql+aiomysql://..., sqlite:///... -> sqlite+aiosqlite:///..."""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
+def engine_options(url: str, pool_mode: str = None, is_async: bool = False) -> dict:
+    """
+    Собирает параметры create_engine из настроек.
+    pool_mode: "queue" (пул соединений) или "null" (новое соединение на каждый запрос).
+    is_async: параметры для create_async_engine (aiomysql/aiosqlite).
+    """
+    pool_mode = (pool_mode or settings.DB_POOL_MODE).lower()
+    backend = make_url(url).get_backend_name()
+
+    options = {}
+    if backend == "sqlite":
+        # pymysql-параметры SQLite не понимает; сессии могут переходить между потоками threadpool
+        options["connect_args"] = {} if is_async else {"check_same_thread": False}
+    elif is_async:
+        # aiomysql не поддерживает read/write timeout на уровне соединения
+        options["connect_args"] = {
+            "connect_timeout": settings.DB_CONNECT_TIMEOUT,
+            "charset": "utf8mb4"
+        }
+    else:
+        options["connect_args"] = {
+            "connect_timeout": settings.DB_CONNECT_TIMEOUT,
+            "read_timeout": settings.DB_READ_TIMEOUT,
+            "write_timeout": settings.DB_WRITE_TIMEOUT,
+            "charset": "utf8mb4"
+        }
+
+    if pool_mode == "null":
+        options["poolclass"] = NullPool
+        return options
+
+    options["pool_pre_ping"] = settings.DB_POOL_PRE_PING
+    options["pool_recycle"] = settings.DB_POOL_RECYCLE
+    if backend == "sqlite" and make_url(url).database in (None, "", ":memory:"):
+        # In-memory SQLite живёт внутри одного соединения - оставляем пул по умолчанию
+        return options
+
+    if not is_async:
+        # Асинхронный движок сам выбирает AsyncAdaptedQueuePool
+        options["poolclass"] = QueuePool
+    options["pool_size"] = settings.DB_POOL_SIZE
+    options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    options["pool_timeout"] = settings.DB_POOL_TIMEOUT
+    return options
+
+# Пул соединений избавляет от TCP+auth рукопожатия с удалённым MySQL на каждый запрос.
+# pre_ping и recycle защищают от соединений, закрытых сервером по wait_timeout.
+# Старое поведение (без пула) доступно через DB_POOL_MODE=null
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def instrument_engine(target):
+    """Время каждого SQL-запроса - в метрики и в счётчик DB-времени текущего HTTP-запроса."""
+    @event.listens_for(target, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        metrics.record_db_query(time.perf_counter() - conn.info["query_start_time"].pop())
+
+    @event.listens_for(target, "handle_error")
+    def _handle_error(context):
+        starts = context.connection.info.get("query_start_time") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+instrument_engine(engine)
+
+def apply_statement_timeout(target, timeout_ms: int = None):
+    """
+    Ограничивает время одного запроса на стороне БД.
+    MySQL: MAX_EXECUTION_TIME сессии (действует на SELECT). SQLite (синхронный драйвер):
+    progress handler прерывает запрос после дедлайна. aiosqlite пропускается.
+    """
+    timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    if not timeout_ms:
+        return
+    backend = target.dialect.name
+    is_async = target.dialect.is_async
+
+    @event.listens_for(target, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        if backend == "mysql":
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_ms)}")
+            cursor.close()
+        elif backend == "sqlite" and not is_async:
+            deadline = connection_record.info["statement_deadline"] = [0.0]
+            # Ненулевой ответ прерывает запрос: sqlite3.OperationalError "interrupted"
+            dbapi_connection.set_progress_handler(
+                lambda: 1 if deadline[0] and time.monotonic() > deadline[0] else 0, 10000
+            )
+
+    if backend == "sqlite" and not is_async:
+        @event.listens_for(target, "before_cursor_execute")
+        def _start_deadline(conn, cursor, statement, parameters, context, executemany):
+            deadline = conn.info.get("statement_deadline")
+            if deadline is not None:
+                deadline[0] = time.monotonic() + timeout_ms / 1000
+
+        @event.listens_for(target, "after_cursor_execute")
+        def _clear_deadline(conn, cursor, statement, parameters, context, executemany):
+            deadline = conn.info.get("statement_deadline")
+            if deadline is not None:
+                deadline[0] = 0.0
+
+# MySQL 1205 (lock wait timeout) и 1213 (deadlock) pymysql тоже поднимает как
+# OperationalError, но это конкуренция за строки, а не недоступность сервера
+LOCK_CONTENTION_ERRORS = (1205, 1213)
+# SQLite: SQLITE_BUSY ("database is locked") и SQLITE_LOCKED ("database table is locked")
+# после busy_timeout - то же самое, файл базы при этом доступен
+SQLITE_LOCK_CONTENTION_CODES = (5, 6)
+SQLITE_LOCK_CONTENTION_MESSAGES = ("database is locked", "database table is locked")
+
+def _is_lock_contention(error) -> bool:
+    args = getattr(error, "args", None)
+    if bool(args) and args[0] in LOCK_CONTENTION_ERRORS:
+        return True
+    if isinstance(error, sqlite3.Error):
+        # Расширенные коды (SQLITE_BUSY_SNAPSHOT и т.п.) несут основной код в младшем байте
+        code = getattr(error, "sqlite_errorcode", None)
+        if code is not None:
+            return (code & 0xFF) in SQLITE_LOCK_CONTENTION_CODES
+        return str(error).startswith(SQLITE_LOCK_CONTENTION_MESSAGES)
+    return False
+
+def attach_breaker(target, breaker: CircuitBreaker):
+    """Каждый запрос проходит через breaker; ошибки соединения и таймауты его открывают."""
+    @event.listens_for(target, "before_cursor_execute")
+    def _breaker_before(conn, cursor, statement, parameters, context, executemany):
+        breaker.check()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _breaker_success(conn, cursor, statement, parameters, context, executemany):
+        breaker.record_success()
+
+    @event.listens_for(target, "handle_error")
+    def _breaker_failure(context):
+        # Нарушения ограничений, синтаксис и блокировки - не признак недоступности БД
+        if _is_lock_contention(context.original_exception):
+            return
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, (OperationalError, InterfaceError)):
+            breaker.record_failure(context.original_exception)
+
+def attach_session_breaker(breaker: CircuitBreaker):
+    """
+    Проверка breaker перед запросом любой сессии основной базы - до получения
+    соединения, connect и pre-ping. Открытый breaker сразу даёт DatabaseUnavailable:
+    /login отвечает 503, get_current_user переходит на устаревший кеш.
+    Сессии реплик (info["replica"]) не проверяются.
+    """
+    @event.listens_for(Session, "do_orm_execute")
+    def _breaker_gate(orm_execute_state):
+        if not orm_execute_state.session.info.get("replica"):
+            breaker.before_call()
+
+db_breaker = CircuitBreaker(
+    "primary",
+    failure_threshold=settings.DB_BREAKER_FAILURE_THRESHOLD,
+    reset_seconds=settings.DB_BREAKER_RESET_SECONDS,
+    half_open_max_calls=settings.DB_BREAKER_HALF_OPEN_MAX_CALLS,
+    enabled=settings.DB_BREAKER_ENABLED,
+)
+apply_statement_timeout(engine)
+attach_breaker(engine, db_breaker)
+attach_session_breaker(db_breaker)
+
 Base = declarative_base()
 
 def get_db():
@@ -35,4 +208,35 @@ def get_db():
     finally:
         db.close()
 
+# Асинхронный путь создаётся только при DB_ASYNC=true, чтобы без него
+# не требовались aiomysql/aiosqlite
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    instrument_engine(async_engine.sync_engine)
+    apply_statement_timeout(async_engine.sync_engine)
+    attach_breaker(async_engine.sync_engine, db_breaker)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Зависимость для роутеров: AsyncSession при DB_ASYNC=true, иначе обычная Session.
+# Функции crud.*_async принимают оба варианта.
+get_session = get_async_db if settings.DB_ASYNC else get_db
 
+@metrics.register_collector
+def _pool_metrics():
+    engines = [("primary", engine)] + ([("primary_async", async_engine.sync_engine)] if async_engine is not None else [])
+    for name, target in engines:
+        pool = target.pool
+        if hasattr(pool, "checkedout"):
+            yield "db_pool_checked_out", "gauge", "Connections currently checked out of the pool", {"engine": name}, pool.checkedout()
+            yield "db_pool_size", "gauge", "Connections currently held by the pool", {"engine": name}, pool.size()
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    yield "db_circuit_state", "gauge", "Primary database breaker: 0 closed, 1 half-open, 2 open", {}, states[db_breaker.state]
@@ -1,38 +1,76 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
-from database import get_db
-import crud, auth, schemas
+from jose import JWTError
+from sqlalchemy.exc import InterfaceError, OperationalError
+from circuit_breaker import DatabaseUnavailable
+import crud, auth, schemas, replicas
+from cache import user_cache
+from singleflight import user_lookups
+from config import settings
+import metrics
 
 # oauth2_scheme is still useful for Swagger UI but we'll manually check cookies too
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+async def get_token_payload(request: Request) -> dict:
+    # async: разбор токена дешёвый, незачем занимать слот threadpool
     # Try to get token from cookie first
     token = request.cookies.get("access_token")
     
     if not token:
          # Optional: Fallback to Header for API testing if needed, or raise error
-         raise credentials_exception
+         raise _credentials_exception()
 
     try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = auth.decode_token(token, auth.ACCESS_TOKEN_TYPE)
     except JWTError:
-        raise credentials_exception
-    user = crud.get_user_by_email(db, email=email)
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+async def get_read_session(payload: dict = Depends(get_token_payload)):
+    """
+    Сессия только для чтения: реплика по кругу или основная база, если реплик нет,
+    они недоступны или пользователь из токена только что изменился.
+    """
+    async with replicas.read_session(payload["sub"]) as db:
+        yield db
+
+async def get_current_user(payload: dict = Depends(get_token_payload), db: Session = Depends(get_read_session)):
+    credentials_exception = _credentials_exception()
+    email: str = payload["sub"]
+
+    # Горячий путь: пользователь уже проверен недавно - БД не трогаем
+    if settings.USER_CACHE_ENABLED:
+        cached = user_cache.get(email)
+        if cached is not None:
+            return schemas.User.model_construct(**cached)
+
+    try:
+        # Одновременные запросы одного пользователя делят один поиск в БД
+        user = await user_lookups.do(email, crud.get_auth_user_read_async, db, email)
+    except (DatabaseUnavailable, OperationalError, InterfaceError):
+        # БД недоступна: лучше ограниченно устаревшие данные, чем 503 на каждый запрос
+        stale = user_cache.get_stale(email) if settings.USER_CACHE_ENABLED else None
+        if stale is None:
+            raise
+        metrics.USER_CACHE_STALE_SERVED.inc()
+        return schemas.User.model_construct(**stale)
     if user is None:
         raise credentials_exception
-    return user
+    current_user = schemas.User.model_validate(user)
+    if settings.USER_CACHE_ENABLED:
+        user_cache.set(email, current_user.model_dump())
+    return current_user
 
 def get_current_active_user(current_user: schemas.User = Depends(get_current_user)):
     if not current_user.is_active:
@@ -52,14 +90,28 @@ def check_role_access(user_role: str, required_role: str):
             detail="The user doesn't have enough privileges"
         )
 
-def get_current_curator(current_user: schemas.User = Depends(get_current_active_user)):
+async def get_current_claims(payload: dict = Depends(get_token_payload)) -> schemas.TokenData:
+    """
+    Авторизация по подписанным claims access-токена, без обращения к БД.
+    Токен живёт ACCESS_TOKEN_EXPIRE_MINUTES, поэтому смена роли или блокировка
+    вступают в силу не позже следующего /refresh, который сверяется с БД.
+    """
+    if payload.get("role") is None or payload.get("active") is None:
+        # Токен выдан до появления claims - нужен повторный вход
+        raise _credentials_exception()
+    claims = schemas.TokenData(email=payload["sub"], role=payload["role"], is_active=payload["active"])
+    if not claims.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return claims
+
+async def get_current_curator(current_user: schemas.TokenData = Depends(get_current_claims)):
     check_role_access(current_user.role, "curator")
     return current_user
 
-def get_current_admin_user(current_user: schemas.User = Depends(get_current_active_user)):
+async def get_current_admin_user(current_user: schemas.TokenData = Depends(get_current_claims)):
     check_role_access(current_user.role, "admin")
     return current_user
 
-def get_current_owner(current_user: schemas.User = Depends(get_current_active_user)):
+async def get_current_owner(current_user: schemas.TokenData = Depends(get_current_claims)):
     check_role_access(current_user.role, "owner")
     return current_user
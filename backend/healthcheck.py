@@ -0,0 +1,62 @@
+from datetime import datetime
+from sqlalchemy import text
+from config import settings
+from database import engine
+import threading
+import time
+
+class DatabaseHealthMonitor:
+    """
+    Фоновая проверка доступности БД для /health/ready.
+    Эндпоинт отдаёт закешированный результат и сам в БД не ходит,
+    поэтому частые опросы балансировщика не нагружают удалённый MySQL.
+    """
+
+    def __init__(self, engine, interval_seconds: float):
+        self.engine = engine
+        self.interval_seconds = interval_seconds
+        self.ready = False
+        self.last_checked_at = None
+        self.last_error = None
+        self.latency_ms = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        started = time.perf_counter()
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            self.ready, self.last_error = True, None
+        except Exception as e:
+            self.ready, self.last_error = False, str(e)
+        self.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.last_checked_at = datetime.utcnow()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="db-health", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "database": "ok" if self.ready else "unavailable",
+            "last_checked_at": self.last_checked_at,
+            "latency_ms": self.latency_ms,
+            "error": self.last_error,
+        }
+
+db_health = DatabaseHealthMonitor(engine, settings.HEALTH_CHECK_INTERVAL_SECONDS)
@@ -0,0 +1,143 @@
+"""
+Счётчики неудачных входов по аккаунту с экспоненциальной блокировкой.
+
+Лимит по IP в rate_limit.py не останавливает перебор с множества адресов,
+а каждая попытка стоит полного bcrypt. Заблокированный аккаунт отклоняется
+до запроса к БД и проверки пароля. Хранилище - то же семейство URI, что
+у limits (memory://, sqlite:///..., redis://), поэтому счётчики можно
+разделить между воркерами и хостами. Обработчик /login вызывает *_async
+варианты: запросы к sqlite/redis уходят в threadpool, а не блокируют event loop.
+"""
+from limits.storage import storage_from_string
+from starlette.concurrency import run_in_threadpool
+from config import settings
+import logging
+import threading
+import time
+import metrics
+import rate_limit # регистрирует схему sqlite:// для storage_from_string
+
+logger = logging.getLogger("app")
+
+class LoginAttemptTracker:
+    def __init__(self, storage_uri: str, threshold: int, base_seconds: float, max_seconds: float,
+                 window_seconds: float, enabled: bool = True):
+        self.storage_uri = storage_uri
+        self.threshold = threshold
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.window_seconds = window_seconds
+        self.enabled = enabled
+        # memory:// отвечает без ввода-вывода - переход в threadpool стоил бы дороже
+        self._blocking = not storage_uri.startswith("memory://")
+        self._storage = None
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.lockouts = 0
+        self.rejected = 0
+
+    @property
+    def storage(self):
+        # Подключение к redis/sqlite - при первом обращении, а не при импорте
+        if self._storage is None:
+            with self._lock:
+                if self._storage is None:
+                    self._storage = storage_from_string(self.storage_uri)
+        return self._storage
+
+    @staticmethod
+    def _keys(email: str):
+        email = email.strip().lower()
+        return f"login:fail:{email}", f"login:lock:{email}"
+
+    def lock_seconds(self, failures: int) -> float:
+        if failures < self.threshold:
+            return 0
+        return min(self.base_seconds * 2 ** (failures - self.threshold), self.max_seconds)
+
+    def retry_after(self, email: str) -> float:
+        """Сколько секунд аккаунт ещё заблокирован; 0 - можно проверять пароль."""
+        if not self.enabled:
+            return 0
+        _, lock_key = self._keys(email)
+        try:
+            if self.storage.get(lock_key) <= 0:
+                return 0
+            remaining = self.storage.get_expiry(lock_key) - time.time()
+        except Exception:
+            # Недоступное хранилище не должно закрывать вход всем
+            logger.warning("Login attempt storage unavailable", exc_info=True)
+            return 0
+        if remaining <= 0:
+            return 0
+        with self._lock:
+            self.rejected += 1
+        metrics.LOGIN_LOCKED_REJECTIONS.inc()
+        return remaining
+
+    def record_failure(self, email: str, known_account: bool = True):
+        metrics.LOGIN_FAILURES.inc(str(known_account).lower())
+        if not self.enabled:
+            return
+        fail_key, lock_key = self._keys(email)
+        try:
+            failures = self.storage.incr(fail_key, self.window_seconds)
+            duration = self.lock_seconds(failures)
+            if duration > 0:
+                self.storage.clear(lock_key)
+                self.storage.incr(lock_key, duration)
+        except Exception:
+            logger.warning("Login attempt storage unavailable", exc_info=True)
+            return
+        with self._lock:
+            self.failures += 1
+            if duration > 0:
+                self.lockouts += 1
+        if duration > 0:
+            metrics.LOGIN_LOCKOUTS.inc()
+
+    def record_success(self, email: str):
+        if not self.enabled:
+            return
+        fail_key, lock_key = self._keys(email)
+        try:
+            self.storage.clear(fail_key)
+            self.storage.clear(lock_key)
+        except Exception:
+            logger.warning("Login attempt storage unavailable", exc_info=True)
+
+    async def _call(self, fn, *args):
+        if self.enabled and self._blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    async def retry_after_async(self, email: str) -> float:
+        return await self._call(self.retry_after, email)
+
+    async def record_failure_async(self, email: str, known_account: bool = True):
+        return await self._call(self.record_failure, email, known_account)
+
+    async def record_success_async(self, email: str):
+        return await self._call(self.record_success, email)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "storage": self.storage_uri.split("://", 1)[0],
+                "threshold": self.threshold,
+                "base_seconds": self.base_seconds,
+                "max_seconds": self.max_seconds,
+                "failures": self.failures,
+                "lockouts": self.lockouts,
+                "rejected": self.rejected,
+            }
+
+login_tracker = LoginAttemptTracker(
+    storage_uri=settings.LOGIN_LOCKOUT_STORAGE_URI or settings.RATE_LIMIT_STORAGE_URI,
+    threshold=settings.LOGIN_LOCKOUT_THRESHOLD,
+    base_seconds=settings.LOGIN_LOCKOUT_BASE_SECONDS,
+    max_seconds=settings.LOGIN_LOCKOUT_MAX_SECONDS,
+    window_seconds=settings.LOGIN_FAILURE_WINDOW_SECONDS,
+    enabled=settings.LOGIN_LOCKOUT_ENABLED,
+)
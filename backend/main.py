@@ -1,12 +1,29 @@
 from fastapi import FastAPI
+import anyio
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
-from database import engine
-import models
+from database import engine, async_engine
 from config import settings
-from routers import auth, users, admin
+from healthcheck import db_health
+from audit import audit_log
+from admission import AdmissionMiddleware
+from serialization import FastJSONResponse
+from logging_config import configure_logging
+from routers import auth, users, admin, health, metrics as metrics_router
+import bulk
+import replicas
+import metrics
+import user_stats
+from token_cleanup import refresh_token_purger
 
-app = FastAPI(title=settings.PROJECT_NAME)
+logger = configure_logging(settings.LOG_FORMAT, settings.LOG_LEVEL)
+
+# JSON-ответы рендерятся через pydantic_core (serialization.FastJSONResponse), а не json.dumps
+app = FastAPI(title=settings.PROJECT_NAME, default_response_class=FastJSONResponse)
+
+# Ограничение параллелизма - самый внутренний middleware: 503 получает CORS-заголовки
+# и учитывается в метриках, а отклонённый запрос не доходит до threadpool и БД
+if settings.LOAD_SHED_ENABLED:
+    app.add_middleware(AdmissionMiddleware, retry_after=settings.LOAD_SHED_RETRY_AFTER_SECONDS)
 
 # Настройка CORS
 origins = [origin.strip() for origin in settings.CORS_ORIGINS.split(",")]
@@ -19,49 +36,99 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
+from rate_limit import limiter
 
-limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
 
 # Global Exception Handler
 from fastapi import Request
 from fastapi.responses import JSONResponse
-import traceback
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+    metrics.RATE_LIMIT_REJECTIONS.inc(route)
+    return _rate_limit_exceeded_handler(request, exc)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    error_msg = f"Unexpected error occurred: {exc}"
-    print(traceback.format_exc()) # Log full traceback to console/logs
+    # Полный traceback в лог (в JSON-режиме - одной записью)
+    logger.exception("Unhandled error", extra={"method": request.method, "path": request.url.path})
     return JSONResponse(
         status_code=500,
         content={"detail": "Произошла внутренняя ошибка сервера. Мы уже работаем над исправлением."},
     )
 
+from auth import PasswordHashingBusy, password_hasher, prepare_dummy_hash
+from circuit_breaker import DatabaseUnavailable
+import math
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    # Пул bcrypt переполнен - отвечаем сразу, не держа соединение в очереди
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Сервер перегружен, попробуйте позже."},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    # Breaker открыт - не ждём таймаутов зависшей БД
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "База данных временно недоступна, попробуйте позже."},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+# Метрики - самый внешний слой, чтобы учитывать и ответы других middleware (429, CORS)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware, logger=logger if settings.LOG_REQUESTS else None)
+
 # Подключение роутеров
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(admin.router)
+app.include_router(health.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router.router)
+
+@app.on_event("startup")
+async def configure_threadpool():
+    # Размер threadpool для синхронных эндпоинтов и зависимостей (по умолчанию в anyio - 40)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.SERVER_THREADPOOL_SIZE
 
 @app.on_event("startup")
 def startup():
-    try:
-        # Создаём таблицы при запуске, если их нет
-        models.Base.metadata.create_all(bind=engine)
-        print("Database tables created/verified!")
-        
-        # Проверяем соединение
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-        print("Database connection successful!")
-    except Exception as e:
-        print(f"Database startup error: {e}")
-        # Не падаем - пусть сервер запустится, ошибки будут видны при запросах
+    # Схема создаётся миграциями (python migrate.py), а не при каждом запуске процесса
+    if settings.DB_MIGRATE_ON_STARTUP:
+        import migrate
+        migrate.upgrade()
+    prepare_dummy_hash()
+    # Готовность к трафику определяет фоновая проверка БД (/health/ready)
+    db_health.start()
+    replicas.start_health_checks()
+    audit_log.start()
+    user_stats.reconciler.start()
+    refresh_token_purger.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    db_health.stop()
+    user_stats.reconciler.stop()
+    refresh_token_purger.stop()
+    # Журнал дописывается до закрытия пула соединений
+    audit_log.stop(timeout=settings.AUDIT_SHUTDOWN_TIMEOUT_SECONDS)
+    password_hasher.shutdown()
+    bulk.shutdown()
+    await replicas.shutdown()
+    engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,205 @@
+"""
+Лёгкие метрики в формате Prometheus без внешних зависимостей.
+Модуль не импортирует остальное приложение, поэтому его можно
+использовать из auth, database и middleware без циклов.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {} # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self.header()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+REGISTRY = []
+# Функции, возвращающие [(имя, тип, help, {labels}, значение)] на момент опроса /metrics
+COLLECTORS = []
+
+def register_collector(fn):
+    COLLECTORS.append(fn)
+    return fn
+
+def render_latest() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collector in COLLECTORS:
+        seen = set()
+        for name, kind, documentation, labels, value in collector():
+            if name not in seen:
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {value}")
+    return "\n".join(lines) + "\n"
+
+# HTTP
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+HTTP_DB_TIME = Histogram("http_request_db_seconds", "Time spent in database queries per HTTP request", ("route",))
+LOAD_SHED_REJECTIONS = Counter("load_shed_rejections_total", "Requests rejected by adaptive admission control", ("priority",))
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter", ("route",))
+
+# Login lockout (login_attempts.py)
+LOGIN_FAILURES = Counter("login_failures_total", "Failed login attempts", ("known_account",))
+LOGIN_LOCKOUTS = Counter("login_lockouts_total", "Accounts locked after repeated failures")
+LOGIN_LOCKED_REJECTIONS = Counter("login_locked_rejections_total", "Login attempts rejected before bcrypt because the account is locked")
+
+# Audit log (audit.py)
+AUDIT_EVENTS = Counter("audit_events_total", "Audit events by outcome", ("outcome",))
+AUDIT_FLUSH_SECONDS = Histogram("audit_flush_duration_seconds", "Time to insert one batch of audit events")
+
+# Database
+DB_QUERIES = Counter("db_queries_total", "Executed SQL statements")
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency")
+DB_BREAKER_TRANSITIONS = Counter("db_circuit_transitions_total", "Circuit breaker state changes", ("breaker", "state"))
+DB_BREAKER_REJECTIONS = Counter("db_circuit_rejections_total", "Queries rejected while the breaker was open", ("breaker",))
+USER_CACHE_STALE_SERVED = Counter("user_cache_stale_served_total", "Users served from expired cache entries because the database was unavailable")
+DB_READ_ROUTING = Counter("db_read_routing_total", "Read sessions by target database and reason", ("target", "reason"))
+USER_STATS_REPAIRED = Counter("user_stats_repaired_total", "user_stats counters rewritten by reconciliation")
+
+# Password hashing (bcrypt)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time inside the worker",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+PASSWORD_HASH_QUEUE_WAIT = Histogram("password_hash_queue_wait_seconds", "Time bcrypt jobs waited for a worker")
+PASSWORD_HASH_REJECTIONS = Counter("password_hash_rejections_total", "bcrypt jobs rejected because the pool was saturated")
+PASSWORD_REHASHES = Counter("password_rehash_total", "Stored hashes upgraded to the current bcrypt cost", ("field", "result"))
+
+# Время запросов к БД в рамках текущего HTTP-запроса. Список, а не число:
+# contextvars копируются в threadpool, а изменения общего списка видны middleware.
+request_db_time = ContextVar("request_db_time", default=None)
+
+def record_db_query(elapsed: float):
+    DB_QUERIES.inc()
+    DB_QUERY_LATENCY.observe(elapsed)
+    holder = request_db_time.get()
+    if holder is not None:
+        holder[0] += elapsed
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: латентность по шаблону маршрута (а не по фактическому пути,
+    чтобы не плодить серии), запросы в работе и время в БД на запрос.
+    """
+
+    def __init__(self, app, logger=None):
+        self.app = app
+        self.logger = logger
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+        db_time = [0.0]
+        token = request_db_time.set(db_time)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            request_db_time.reset(token)
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, status_holder[0])
+            HTTP_LATENCY.observe(elapsed, method, route)
+            HTTP_DB_TIME.observe(db_time[0], route)
+            if self.logger is not None:
+                self.logger.info(
+                    "request",
+                    extra={
+                        "method": method,
+                        "route": route,
+                        "path": scope["path"],
+                        "status": status_holder[0],
+                        "duration_ms": round(elapsed * 1000, 2),
+                        "db_ms": round(db_time[0] * 1000, 2),
+                    },
+                )
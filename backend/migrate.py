@@ -0,0 +1,96 @@
+"""
+Применяет миграции схемы из каталога migrations/ отдельно от запуска API.
+
+    python migrate.py            # применить все недостающие миграции
+    python migrate.py --status   # показать применённые и ожидающие
+
+Применённые версии хранятся в таблице schema_migrations. На MySQL команда
+берёт GET_LOCK, поэтому одновременный запуск с нескольких хостов безопасен.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select, text
+
+from database import engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+LOCK_NAME = "schema_migrations"
+
+metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", metadata,
+    Column("version", String(32), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def discover():
+    """Возвращает [(version, description, module)] в порядке номеров."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not filename[:4].isdigit() or not filename.endswith(".py"):
+            continue
+        version = filename[:-3]
+        spec = importlib.util.spec_from_file_location(f"migrations.{version}", os.path.join(MIGRATIONS_DIR, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migrations.append((version, (module.__doc__ or "").strip(), module))
+    return migrations
+
+@contextmanager
+def migration_lock(connection):
+    if connection.dialect.name != "mysql":
+        yield
+        return
+    if connection.execute(text("SELECT GET_LOCK(:name, 60)"), {"name": LOCK_NAME}).scalar() != 1:
+        raise RuntimeError("Could not acquire migration lock")
+    try:
+        yield
+    finally:
+        connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+def applied_versions(connection) -> set:
+    metadata.create_all(connection, checkfirst=True)
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+def upgrade(bind=engine) -> list:
+    """Применяет недостающие миграции, каждую в своей транзакции. Возвращает их версии."""
+    applied = []
+    with bind.connect() as connection:
+        with migration_lock(connection):
+            done = applied_versions(connection)
+            connection.commit()
+            for version, description, module in discover():
+                if version in done:
+                    continue
+                with connection.begin():
+                    module.upgrade(connection)
+                    connection.execute(schema_migrations.insert().values(version=version, applied_at=datetime.utcnow()))
+                print(f"Applied {version}: {description}")
+                applied.append(version)
+    return applied
+
+def status(bind=engine):
+    with bind.connect() as connection:
+        done = applied_versions(connection)
+        connection.commit()
+    for version, description, _ in discover():
+        print(f"[{'x' if version in done else ' '}] {version}: {description}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="только показать состояние миграций")
+    args = parser.parse_args()
+
+    if args.status:
+        status()
+        return
+    applied = upgrade()
+    print(f"Database schema is up to date ({len(applied)} migration(s) applied).")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Таблицы users и refresh_tokens (уже существующие базы не трогаем - checkfirst)."""
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table
+from sqlalchemy.sql import func
+
+metadata = MetaData()
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String(255), unique=True, index=True, nullable=False),
+    Column("hashed_password", String(255), nullable=False),
+    Column("full_name", String(255)),
+    Column("role", String(50)),
+    Column("admin_password_hash", String(255), nullable=True),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+refresh_tokens = Table(
+    "refresh_tokens", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("jti", String(64), unique=True, index=True, nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False),
+    Column("remember_me", Boolean),
+    Column("expires_at", DateTime, nullable=False),
+    Column("revoked_at", DateTime, nullable=True),
+    Column("replaced_by", String(64), nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
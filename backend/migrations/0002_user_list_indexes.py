@@ -0,0 +1,24 @@
+"""Составные индексы users для keyset-пагинации /admin/users."""
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, MetaData, String, Table
+
+metadata = MetaData()
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("full_name", String(255)),
+    Column("role", String(50)),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime(timezone=True)),
+)
+
+indexes = [
+    Index("ix_users_created_at_id", users.c.created_at, users.c.id),
+    Index("ix_users_role_created_at_id", users.c.role, users.c.created_at, users.c.id),
+    Index("ix_users_is_active_created_at_id", users.c.is_active, users.c.created_at, users.c.id),
+    Index("ix_users_full_name", users.c.full_name),
+]
+
+def upgrade(connection):
+    for index in indexes:
+        index.create(connection, checkfirst=True)
@@ -0,0 +1,23 @@
+"""Таблица audit_events для журнала аутентификации."""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table
+
+metadata = MetaData()
+
+# users нужна только для внешнего ключа; create_all её не трогает (checkfirst)
+users = Table("users", metadata, Column("id", Integer, primary_key=True))
+
+audit_events = Table(
+    "audit_events", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("event", String(32), nullable=False),
+    Column("email", String(255), nullable=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+    Column("ip", String(45), nullable=True),
+    Column("user_agent", String(255), nullable=True),
+    Column("detail", String(255), nullable=True),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Index("ix_audit_events_email_created_at", "email", "created_at"),
+)
+
+def upgrade(connection):
+    audit_events.create(connection, checkfirst=True)
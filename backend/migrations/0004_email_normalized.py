@@ -0,0 +1,25 @@
+"""Колонка users.email_normalized (email.strip().lower()) с индексом для поиска без учёта регистра."""
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, inspect, text
+from migrations import normalize_emails
+
+metadata = MetaData()
+
+# Копия models.normalize_email на момент миграции: models меняется, миграция - нет
+def normalize_email(email: str) -> str:
+    return email.strip().lower() if email else email
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("email", String(255)),
+    Column("email_normalized", String(255)),
+)
+
+index = Index("ix_users_email_normalized", users.c.email_normalized)
+
+def upgrade(connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("users")}
+    if "email_normalized" not in columns:
+        connection.execute(text("ALTER TABLE users ADD COLUMN email_normalized VARCHAR(255)"))
+    normalize_emails(connection, users, normalize_email)
+    index.create(connection, checkfirst=True)
@@ -0,0 +1,41 @@
+"""Таблица user_stats со счётчиками для /admin/stats, заполняется по текущим users."""
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, case, false, func, literal_column, select
+
+metadata = MetaData()
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("role", String(50)),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime),
+)
+
+user_stats = Table(
+    "user_stats", metadata,
+    Column("dimension", String(16), primary_key=True),
+    Column("bucket", String(64), primary_key=True),
+    Column("count", Integer, nullable=False, default=0),
+)
+
+def _constant(value: str):
+    # Константы прямо в SQL: MySQL с ONLY_FULL_GROUP_BY не сопоставит параметры в SELECT и GROUP BY
+    return literal_column(f"'{value}'")
+
+def _backfill(connection, dimension: str, bucket, where=None, grouped: bool = True):
+    query = select(_constant(dimension), bucket, func.count()).select_from(users)
+    if where is not None:
+        query = query.where(where)
+    if grouped:
+        query = query.group_by(bucket)
+    connection.execute(user_stats.insert().from_select(["dimension", "bucket", "count"], query))
+
+def upgrade(connection):
+    user_stats.create(connection, checkfirst=True)
+    if connection.execute(select(func.count()).select_from(user_stats)).scalar():
+        return
+    # Те же правила, что в user_stats.py: NULL роль - user, NULL is_active - активен
+    _backfill(connection, "total", _constant("all"), grouped=False)
+    _backfill(connection, "role", func.coalesce(users.c.role, _constant("user")))
+    _backfill(connection, "status", case((users.c.is_active == false(), _constant("inactive")), else_=_constant("active")))
+    _backfill(connection, "signups", func.date(users.c.created_at), users.c.created_at.is_not(None))
@@ -0,0 +1,15 @@
+"""Индекс refresh_tokens.expires_at для фоновой очистки истёкших токенов."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Table
+
+metadata = MetaData()
+
+refresh_tokens = Table(
+    "refresh_tokens", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("expires_at", DateTime, nullable=False),
+)
+
+index = Index("ix_refresh_tokens_expires_at", refresh_tokens.c.expires_at)
+
+def upgrade(connection):
+    index.create(connection, checkfirst=True)
@@ -0,0 +1,31 @@
+"""users.email_normalized: пересчёт как email.strip().lower() и NOT NULL."""
+from sqlalchemy import Column, Integer, MetaData, String, Table, text
+from migrations import normalize_emails
+
+metadata = MetaData()
+
+# Та же нормализация, что в 0004; не импортируется из models
+def normalize_email(email: str) -> str:
+    return email.strip().lower() if email else email
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("email", String(255)),
+    Column("email_normalized", String(255)),
+)
+
+def upgrade(connection):
+    # Базы, прошедшие первую версию 0004, заполнены LOWER(TRIM(email)) - проверяем все строки
+    normalize_emails(connection, users, normalize_email, only_missing=False)
+    if connection.dialect.name == "mysql":
+        connection.execute(text("ALTER TABLE users MODIFY email_normalized VARCHAR(255) NOT NULL"))
+        return
+    # SQLite не меняет ограничения существующих колонок без пересборки таблицы
+    # (на неё ссылаются refresh_tokens и audit_events) - NOT NULL проверяют триггеры
+    for event in ("INSERT", "UPDATE"):
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS users_email_normalized_not_null_{event.lower()} "
+            f"BEFORE {event} ON users FOR EACH ROW WHEN NEW.email_normalized IS NULL "
+            "BEGIN SELECT RAISE(ABORT, 'NOT NULL constraint failed: users.email_normalized'); END"
+        ))
@@ -0,0 +1,33 @@
+"""
+Версионированные миграции схемы. Каждый модуль NNNN_name.py содержит
+функцию upgrade(connection) и описывает таблицы явно, а не через models,
+чтобы старые миграции не менялись вместе с моделями.
+Применяются командой `python migrate.py`.
+"""
+from sqlalchemy import bindparam, select, update
+
+def normalize_emails(connection, users, normalize, only_missing: bool = True, batch_size: int = 1000) -> int:
+    """
+    Заполняет users.email_normalized функцией normalize пачками по id; normalize
+    каждая миграция объявляет сама, а не берёт models.normalize_email. В Python,
+    а не LOWER(TRIM()) в SQL: SQLite меняет регистр только у ASCII и расходится
+    с str.lower() для не-ASCII адресов. Возвращает число исправленных строк.
+    """
+    statement = update(users).where(users.c.id == bindparam("row_id")).values(email_normalized=bindparam("normalized"))
+    fixed, last_id = 0, 0
+    while True:
+        query = select(users.c.id, users.c.email, users.c.email_normalized).where(users.c.id > last_id)
+        if only_missing:
+            query = query.where(users.c.email_normalized.is_(None))
+        rows = connection.execute(query.order_by(users.c.id).limit(batch_size)).all()
+        if not rows:
+            return fixed
+        last_id = rows[-1].id
+        changes = [
+            {"row_id": row.id, "normalized": normalize(row.email)}
+            for row in rows
+            if row.email_normalized != normalize(row.email)
+        ]
+        if changes:
+            connection.execute(statement, changes)
+            fixed += len(changes)
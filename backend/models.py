@@ -1,7 +1,16 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import validates
 from sqlalchemy.sql import func
 from database import Base
 
+def normalize_email(email: str) -> str:
+    return email.strip().lower() if email else email
+
+def _default_email_normalized(context):
+    # Для INSERT через Core (bulk.py передаёт значение сам)
+    return normalize_email(context.get_current_parameters()["email"])
+
 class User(Base):
     __tablename__ = "users"
 
@@ -10,11 +19,94 @@ class User(Base):
     ROLE_ADMIN = "admin"
     ROLE_OWNER = "owner"
 
+    # Keyset-пагинация /admin/users идёт по (created_at, id) в обратном порядке;
+    # фильтры по роли и активности используют свой префикс индекса (миграция 0002)
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index("ix_users_role_created_at_id", "role", "created_at", "id"),
+        Index("ix_users_is_active_created_at_id", "is_active", "created_at", "id"),
+        Index("ix_users_full_name", "full_name"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
+    # Поиск по email без учёта регистра идёт по этой колонке (миграции 0004, 0007)
+    email_normalized = Column(String(255), index=True, nullable=False, default=_default_email_normalized)
     hashed_password = Column(String(255), nullable=False)
     full_name = Column(String(255))
     role = Column(String(50), default=ROLE_USER)
     admin_password_hash = Column(String(255), nullable=True)
     is_active = Column(Boolean, default=True)
+    # SQLite хранит CURRENT_TIMESTAMP без микросекунд; тот же формат у параметров,
+    # иначе сравнение created_at с курсором идёт как строк разной длины
+    created_at = Column(
+        DateTime(timezone=True).with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite"),
+        server_default=func.now(),
+    )
+
+    @validates("email")
+    def _sync_email_normalized(self, key, email):
+        # Смена email через ORM сразу обновляет и нормализованную копию
+        self.email_normalized = normalize_email(email)
+        return email
+
+class RefreshToken(Base):
+    """
+    Выданные refresh-токены. Проверяются только в /refresh и /logout:
+    отозванный или заменённый токен больше не обменивается на access-токен.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String(64), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    remember_me = Column(Boolean, default=False)
+    # Индекс для token_cleanup.py (миграция 0006)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=True)
+    replaced_by = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AuditEvent(Base):
+    """
+    Журнал событий аутентификации. Пишется пачками фоновым потоком (audit.py),
+    поэтому created_at - время события, а не вставки.
+    """
+    __tablename__ = "audit_events"
+
+    EVENT_LOGIN = "login"
+    EVENT_LOGIN_FAILED = "login_failed"
+    EVENT_REGISTER = "register"
+    EVENT_LOGOUT = "logout"
+    EVENT_ADMIN_VERIFY = "admin_verify"
+    EVENT_ADMIN_VERIFY_FAILED = "admin_verify_failed"
+
+    __table_args__ = (
+        Index("ix_audit_events_email_created_at", "email", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    event = Column(String(32), nullable=False)
+    email = Column(String(255), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    ip = Column(String(45), nullable=True)
+    user_agent = Column(String(255), nullable=True)
+    detail = Column(String(255), nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+class UserStat(Base):
+    """
+    Счётчики пользователей для /admin/stats. Обновляются в той же транзакции,
+    что и users (user_stats.py), периодическая сверка исправляет расхождения.
+    bucket: "all" для total, роль, active/inactive или дата YYYY-MM-DD для signups.
+    """
+    __tablename__ = "user_stats"
+
+    DIMENSION_TOTAL = "total"
+    DIMENSION_ROLE = "role"
+    DIMENSION_STATUS = "status"
+    DIMENSION_SIGNUPS = "signups"
+
+    dimension = Column(String(16), primary_key=True)
+    bucket = Column(String(64), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,142 @@
+"""
+Маршрутизация чтений на реплики (DATABASE_REPLICA_URLS).
+
+Запись и всё, что читает перед записью (login, register, /refresh), идёт в основную
+базу через database.get_session. Аутентифицированные чтения берут сессию
+dependencies.get_read_session: реплики выбираются по кругу среди прошедших
+фоновую проверку. Пользователь, чья строка только что изменилась, читается
+из основной базы ещё REPLICA_READ_YOUR_WRITES_SECONDS - реплика может отставать.
+
+Локально: DATABASE_REPLICA_URLS=sqlite:///./replica.db (копия sql_app.db)
+или второй экземпляр MySQL.
+"""
+from contextlib import asynccontextmanager
+from itertools import count
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from cache import TTLCache
+from config import settings
+from healthcheck import DatabaseHealthMonitor
+import os
+import database
+import metrics
+import models
+
+REPLICA_URLS = [
+    url.strip()
+    for url in (os.getenv("DATABASE_REPLICA_URLS") or settings.DATABASE_REPLICA_URLS).split(",")
+    if url.strip()
+]
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_engine(url, **database.engine_options(url))
+        database.instrument_engine(self.engine)
+        database.apply_statement_timeout(self.engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine, info={"replica": name})
+        self.async_engine = None
+        self.AsyncSessionLocal = None
+        if settings.DB_ASYNC:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            async_url = database.async_database_url(url)
+            self.async_engine = create_async_engine(async_url, **database.engine_options(async_url, is_async=True))
+            database.instrument_engine(self.async_engine.sync_engine)
+            database.apply_statement_timeout(self.async_engine.sync_engine)
+            self.AsyncSessionLocal = async_sessionmaker(
+                self.async_engine, autoflush=False, expire_on_commit=False, info={"replica": name}
+            )
+        self.health = DatabaseHealthMonitor(self.engine, settings.HEALTH_CHECK_INTERVAL_SECONDS)
+
+    def snapshot(self) -> dict:
+        return {"name": self.name, **self.health.snapshot()}
+
+replicas = [Replica(f"replica{i}", url) for i, url in enumerate(REPLICA_URLS, start=1)]
+_round_robin = count()
+
+# Пользователи, изменённые в этом процессе: email -> True на время отставания реплик.
+# Для других воркеров страхует повторное чтение из основной базы, если строки нет.
+recent_writes = TTLCache(100000, settings.REPLICA_READ_YOUR_WRITES_SECONDS)
+
+def mark_user_written(email: str):
+    if replicas and email:
+        recent_writes.set(email, True)
+
+@event.listens_for(models.User, "after_insert")
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _mark_on_change(mapper, connection, target):
+    mark_user_written(target.email)
+
+def choose_replica(email: str = None):
+    """Реплика для чтения или None - читать из основной базы."""
+    if not replicas:
+        return None
+    if email and recent_writes.get(email):
+        metrics.DB_READ_ROUTING.inc("primary", "recent_write")
+        return None
+    healthy = [replica for replica in replicas if replica.health.ready]
+    if not healthy:
+        metrics.DB_READ_ROUTING.inc("primary", "no_healthy_replica")
+        return None
+    replica = healthy[next(_round_robin) % len(healthy)]
+    metrics.DB_READ_ROUTING.inc(replica.name, "round_robin")
+    return replica
+
+def is_replica_session(db) -> bool:
+    return bool(db.info.get("replica"))
+
+async def _close(db):
+    # Сессия, не начавшая транзакцию (ответ из кеша), закрывается без ввода-вывода -
+    # незачем занимать поток threadpool
+    if db.in_transaction():
+        await run_in_threadpool(db.close)
+    else:
+        db.close()
+
+@asynccontextmanager
+async def primary_session():
+    if settings.DB_ASYNC:
+        async with database.AsyncSessionLocal() as db:
+            yield db
+        return
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        await _close(db)
+
+@asynccontextmanager
+async def read_session(email: str = None):
+    replica = choose_replica(email)
+    if replica is None:
+        async with primary_session() as db:
+            yield db
+        return
+    if settings.DB_ASYNC:
+        async with replica.AsyncSessionLocal() as db:
+            yield db
+        return
+    db = replica.SessionLocal()
+    try:
+        yield db
+    finally:
+        await _close(db)
+
+def start_health_checks():
+    for replica in replicas:
+        replica.health.start()
+
+async def shutdown():
+    for replica in replicas:
+        replica.health.stop()
+        replica.engine.dispose()
+        if replica.async_engine is not None:
+            await replica.async_engine.dispose()
+
+@metrics.register_collector
+def _replica_metrics():
+    for replica in replicas:
+        yield "db_replica_ready", "gauge", "Replica passed the last health check", {"replica": replica.name}, int(replica.health.ready)
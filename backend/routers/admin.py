@@ -1,8 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from typing import Optional
 from sqlalchemy.orm import Session
-from database import get_db
-import schemas, auth
-from dependencies import get_current_curator
+from database import get_session
+from config import settings
+import schemas, auth, crud, bulk, user_stats
+from cache import user_cache
+from singleflight import user_lookups
+from login_attempts import login_tracker
+from audit import audit_log
+from admission import admission_limit
+from models import AuditEvent
+from dependencies import get_current_curator, get_current_admin_user, get_read_session
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -11,10 +20,12 @@ class AdminVerifyRequest(BaseModel):
     password: str
 
 @router.post("/verify-password")
-def verify_admin_password(
+async def verify_admin_password(
+    request: Request,
     data: AdminVerifyRequest,
-    current_user: schemas.User = Depends(get_current_curator),
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    current_user: schemas.TokenData = Depends(get_current_curator),
+    db: Session = Depends(get_session)
 ):
     """
     Эндпоинт для перепроверки специального админ-пароля.
@@ -22,14 +33,14 @@ def verify_admin_password(
     Если пароль в БД в открытом виде (не начинается с bcrypt), 
     он хешируется после первой успешной проверки.
     """
-    from crud import get_user_by_email
-    db_user = get_user_by_email(db, email=current_user.email)
+    db_user = await crud.get_admin_credentials_async(db, email=current_user.email)
     
     if not db_user or not db_user.admin_password_hash:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Админ-пароль не установлен"
         )
+    user_id = db_user.id
     
     # Проверка: если это обычный текст (не хеш bcrypt)
     # bcrypt хеши обычно начинаются с $2b$ или $2a$
@@ -37,20 +48,154 @@ def verify_admin_password(
     
     verified = False
     if is_hashed:
-        verified = auth.verify_password(data.password, db_user.admin_password_hash)
+        verified = await auth.verify_password_async(data.password, db_user.admin_password_hash)
+        if verified and auth.password_needs_update(db_user.admin_password_hash):
+            background_tasks.add_task(
+                crud.rehash_password, db_user.id, "admin_password_hash", db_user.admin_password_hash, data.password
+            )
     else:
         # Сравнение как открытый текст
         verified = (data.password == db_user.admin_password_hash)
         if verified:
             # Автоматическое хеширование после первой проверки
-            db_user.admin_password_hash = auth.get_password_hash(data.password)
-            db.commit()
-            db.refresh(db_user)
+            hashed_password = await auth.get_password_hash_async(data.password)
+            await crud.set_admin_password_hash_async(db, user_id, db_user.email, hashed_password)
 
     if not verified:
+        audit_log.record(AuditEvent.EVENT_ADMIN_VERIFY_FAILED, request, email=current_user.email, user_id=user_id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный админ-пароль"
         )
+    audit_log.record(AuditEvent.EVENT_ADMIN_VERIFY, request, email=current_user.email, user_id=user_id)
     
     return {"status": "success", "message": "Пароль подтвержден"}
+
+@router.get("/metrics/password-hashing")
+def password_hashing_metrics(current_user: schemas.TokenData = Depends(get_current_admin_user)):
+    """
+    Состояние пула bcrypt: очередь, отказы (503), время ожидания и хеширования.
+    """
+    return auth.password_hasher.stats()
+
+@router.get("/metrics/user-cache")
+def user_cache_metrics(current_user: schemas.TokenData = Depends(get_current_admin_user)):
+    """
+    Кеш пользователей get_current_user: попадания, промахи, вытеснения и сбросы.
+    """
+    return user_cache.stats()
+
+@router.get("/metrics/user-lookups")
+def user_lookup_metrics(current_user: schemas.TokenData = Depends(get_current_admin_user)):
+    """
+    Single-flight поиска пользователя: выполненные запросы к БД и запросы, получившие чужой результат.
+    """
+    return user_lookups.stats()
+
+@router.get("/metrics/login-attempts")
+def login_attempt_metrics(current_user: schemas.TokenData = Depends(get_current_admin_user)):
+    """
+    Блокировки входа по аккаунтам: неудачные попытки, блокировки и отказы до bcrypt.
+    """
+    return login_tracker.stats()
+
+@router.get("/metrics/audit")
+def audit_metrics(current_user: schemas.TokenData = Depends(get_current_admin_user)):
+    """
+    Журнал аутентификации: очередь, записанные пачки и отброшенные события.
+    """
+    return audit_log.stats()
+
+@router.get("/metrics/admission")
+def admission_metrics(current_user: schemas.TokenData = Depends(get_current_admin_user)):
+    """
+    Адаптивный лимит параллелизма: текущий лимит, запросы в работе и отказы (503).
+    """
+    return admission_limit.stats()
+
+@router.get("/stats", response_model=schemas.UserStats)
+async def stats(
+    days: int = Query(30, ge=1, le=settings.USER_STATS_MAX_DAYS, description="Регистрации за последние N дней"),
+    current_user: schemas.TokenData = Depends(get_current_admin_user),
+    db: Session = Depends(get_read_session)
+):
+    """
+    Пользователи по ролям и статусу и регистрации по дням. Числа берутся из
+    таблицы user_stats, а не COUNT(*) по users, и кешируются на USER_STATS_CACHE_TTL_SECONDS.
+    """
+    return await user_stats.get_stats(db, days)
+
+@router.get("/metrics/user-stats")
+def user_stats_metrics(current_user: schemas.TokenData = Depends(get_current_admin_user)):
+    """
+    Сверка user_stats с users: когда была, сколько счётчиков исправила, ошибка.
+    """
+    return {"reconciler": user_stats.reconciler.snapshot(), "cache": user_stats.stats_cache.stats()}
+
+@router.get("/users", response_model=schemas.UserPage)
+async def list_users(
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=200),
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    email: Optional[str] = Query(None, description="Префикс email"),
+    full_name: Optional[str] = Query(None, description="Префикс имени"),
+    current_user: schemas.TokenData = Depends(get_current_admin_user),
+    db: Session = Depends(get_read_session)
+):
+    """
+    Список пользователей для админки, новые первыми.
+    Пагинация курсором: передайте next_cursor, пока он не станет null.
+    """
+    try:
+        rows, next_cursor = await crud.list_users_async(
+            db,
+            limit=limit,
+            cursor=cursor,
+            role=role,
+            is_active=is_active,
+            email_prefix=email,
+            name_prefix=full_name,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.UserPage(
+        items=[schemas.User.model_validate(row._mapping) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+@router.post("/users/import")
+async def import_users(
+    request: Request,
+    format: str = Query(None, description="csv | ndjson; по умолчанию по Content-Type"),
+    current_user: schemas.TokenData = Depends(get_current_admin_user),
+    db: Session = Depends(get_session)
+):
+    """
+    Массовое создание пользователей из CSV (email,password,full_name) или NDJSON.
+    Тело читается потоком; ответ - число созданных и ошибки по строкам.
+    """
+    fmt = format or ("ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+    if fmt not in bulk.IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of {bulk.IMPORT_FORMATS}")
+    try:
+        return await bulk.import_users(db, request.stream(), fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/users/export")
+def export_users(
+    format: str = Query("csv", description="csv | ndjson"),
+    current_user: schemas.TokenData = Depends(get_current_admin_user)
+):
+    """
+    Выгрузка таблицы пользователей потоком (без хешей паролей).
+    """
+    if format not in bulk.IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of {bulk.IMPORT_FORMATS}")
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        bulk.export_users(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
@@ -1,86 +1,184 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from database import get_db
+from datetime import datetime, timedelta
+from jose import JWTError
+from database import get_session
 import schemas, crud, auth
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 from fastapi import Request
-
-# We need to access the limiter instance from the app state or a global dependency
-# For simplicity with the pattern used in main.py, we can re-instantiate or import. 
-# Better pattern: generic dependency. But for now, let's grab it from Request state or just new instance sharing storage (memory).
-# Actually, standard way is:
-limiter = Limiter(key_func=get_remote_address) # It shares state if using in-memory default
+from fastapi.responses import JSONResponse
+from rate_limit import limiter
+from login_attempts import login_tracker
+from audit import audit_log
+from models import AuditEvent
+import math
 
 router = APIRouter(tags=["auth"])
 
-@router.post("/register", response_model=schemas.User)
-@limiter.limit("5/minute")
-def register(request: Request, response: Response, user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Create user
-    new_user = crud.create_user(db=db, user=user)
-    
-    # Auto-login: Create token and set cookie
+REFRESH_COOKIE_PATH = "/"
+
+def _set_auth_cookies(response: Response, email: str, role: str, is_active: bool, refresh_jti: str, remember_me: bool):
+    """
+    Короткоживущий access-токен с подписанными claims роли и активности
+    и refresh-токен для его обновления через /refresh.
+    """
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": new_user.email, "role": new_user.role}, expires_delta=access_token_expires
+        data={"sub": email, "role": role, "active": is_active},
+        expires_delta=access_token_expires
     )
-    
     response.set_cookie(
         key="access_token",
         value=access_token,
         httponly=True,
         max_age=auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        expires=auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        expires=auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60, # Some browsers prefer expires, others max_age
         samesite="lax",
         secure=auth.settings.SECURE_COOKIES, 
     )
+
+    refresh_days = auth.refresh_token_days(remember_me)
+    refresh_token = auth.create_refresh_token(email, refresh_jti, timedelta(days=refresh_days))
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,
+        # Без "Remember Me" - сессионная cookie, исчезает при закрытии браузера
+        max_age=refresh_days * 24 * 60 * 60 if remember_me else None,
+        expires=refresh_days * 24 * 60 * 60 if remember_me else None,
+        path=REFRESH_COOKIE_PATH,
+        samesite="lax",
+        secure=auth.settings.SECURE_COOKIES,
+    )
+    return access_token
+
+async def _start_session(response: Response, db, db_user, remember_me: bool):
+    jti = auth.new_token_id()
+    expires_at = datetime.utcnow() + timedelta(days=auth.refresh_token_days(remember_me))
+    email, role, is_active, user_id = db_user.email, db_user.role, db_user.is_active, db_user.id
+    await crud.issue_refresh_token_async(db, user_id, jti, expires_at, remember_me)
+    return _set_auth_cookies(response, email, role, is_active, jti, remember_me)
+
+@router.post("/register", response_model=schemas.User)
+@limiter.limit(auth.settings.RATE_LIMIT_REGISTER)
+async def register(request: Request, response: Response, user: schemas.UserCreate, db: Session = Depends(get_session)):
+    # Обработчик асинхронный: bcrypt считается в auth.password_hasher,
+    # а запросы к БД идут через AsyncSession или синхронную Session в threadpool
+    if await crud.email_exists_async(db, email=user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    
+    # Create user
+    new_user = schemas.User.model_validate(await crud.create_user_async(db=db, user=user))
+    
+    # Auto-login: Create tokens and set cookies
+    await _start_session(response, db, new_user, remember_me=False)
+    audit_log.record(AuditEvent.EVENT_REGISTER, request, email=new_user.email, user_id=new_user.id)
     
     return new_user
 
 @router.post("/login", response_model=schemas.Token)
-@limiter.limit("5/minute")
-def login(request: Request, response: Response, user: schemas.UserLogin, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if not db_user or not auth.verify_password(user.password, db_user.hashed_password):
+@limiter.limit(auth.settings.RATE_LIMIT_LOGIN)
+async def login(
+    request: Request,
+    response: Response,
+    user: schemas.UserLogin,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_session)
+):
+    # Заблокированный после серии неудач аккаунт отклоняем до БД и bcrypt
+    retry_after = await login_tracker.retry_after_async(user.email)
+    if retry_after > 0:
+        audit_log.record(AuditEvent.EVENT_LOGIN_FAILED, request, email=user.email, detail="locked")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    # Только id, email, хеш, роль и статус - без полной ORM-сущности
+    db_user = await crud.get_user_credentials_async(db, email=user.email)
+    if db_user:
+        verified = await auth.verify_password_async(user.password, db_user.hashed_password)
+    else:
+        verified = await auth.verify_dummy_password(user.password)
+    if not verified:
+        await login_tracker.record_failure_async(user.email, known_account=db_user is not None)
+        audit_log.record(
+            AuditEvent.EVENT_LOGIN_FAILED, request, email=user.email,
+            user_id=db_user.id if db_user else None,
+            detail="invalid_password" if db_user else "unknown_email",
+        )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    # Determine expiration time
-    if user.remember_me:
-        # 30 days for "Remember Me"
-        expires_minutes = 30 * 24 * 60 
-    else:
-        # Default session duration
-        expires_minutes = auth.ACCESS_TOKEN_EXPIRE_MINUTES
+    await login_tracker.record_success_async(user.email)
+    if not db_user.is_active:
+        audit_log.record(AuditEvent.EVENT_LOGIN_FAILED, request, email=user.email, user_id=db_user.id, detail="inactive")
+        raise HTTPException(status_code=400, detail="Inactive user")
 
-    access_token_expires = timedelta(minutes=expires_minutes)
-    access_token = auth.create_access_token(
-        data={"sub": db_user.email, "role": db_user.role}, 
-        expires_delta=access_token_expires
-    )
-    
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        max_age=expires_minutes * 60,
-        expires=expires_minutes * 60, # Some browsers prefer expires, others max_age
-        samesite="lax",
-        secure=auth.settings.SECURE_COOKIES, 
-    )
+    # Хеш с устаревшей стоимостью bcrypt пересчитываем после ответа
+    if auth.password_needs_update(db_user.hashed_password):
+        background_tasks.add_task(
+            crud.rehash_password, db_user.id, "hashed_password", db_user.hashed_password, user.password
+        )
+
+    # "Remember Me" продлевает refresh-токен (30 дней), access-токен всегда короткий
+    user_id = db_user.id
+    access_token = await _start_session(response, db, db_user, remember_me=user.remember_me)
+    audit_log.record(AuditEvent.EVENT_LOGIN, request, email=user.email, user_id=user_id)
     
     return {"access_token": access_token, "token_type": "bearer"} # Still return it for client info if needed, but client should ignore
 
+def _refresh_rejected() -> JSONResponse:
+    """
+    401 с удалением refresh-cookie. Ответ возвращается, а не бросается HTTPException:
+    заголовки внедрённого Response при исключении теряются, и cookie осталась бы.
+    """
+    response = JSONResponse(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        content={"detail": "Could not validate credentials"},
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    response.delete_cookie("refresh_token", path=REFRESH_COOKIE_PATH)
+    return response
+
+@router.post("/refresh", response_model=schemas.Token)
+@limiter.limit(auth.settings.RATE_LIMIT_REFRESH)
+async def refresh(request: Request, response: Response, db: Session = Depends(get_session)):
+    """
+    Ротация refresh-токена: старый отзывается, выдаётся новая пара токенов
+    с актуальными из БД ролью и статусом. Единственное место, где
+    проверяется список отозванных токенов.
+    """
+    token = request.cookies.get("refresh_token")
+    if not token:
+        return _refresh_rejected()
+    try:
+        payload = auth.decode_token(token, auth.REFRESH_TOKEN_TYPE)
+    except JWTError:
+        return _refresh_rejected()
+
+    new_jti = auth.new_token_id()
+    current_user, remember_me = await crud.rotate_refresh_token_async(db, payload.get("jti"), new_jti)
+    if current_user is None:
+        return _refresh_rejected()
+
+    access_token = _set_auth_cookies(
+        response, current_user.email, current_user.role, current_user.is_active, new_jti, remember_me
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
 @router.post("/logout")
-def logout(response: Response):
+async def logout(request: Request, response: Response, db: Session = Depends(get_session)):
+    token = request.cookies.get("refresh_token")
+    if token:
+        try:
+            payload = auth.decode_token(token, auth.REFRESH_TOKEN_TYPE)
+            await crud.revoke_refresh_token_async(db, payload.get("jti"))
+            audit_log.record(AuditEvent.EVENT_LOGOUT, request, email=payload.get("sub"))
+        except JWTError:
+            pass
     response.delete_cookie("access_token")
+    response.delete_cookie("refresh_token", path=REFRESH_COOKIE_PATH)
     return {"message": "Logged out successfully"}
-
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Response, status
+from healthcheck import db_health
+from database import db_breaker
+import replicas
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+@router.get("/live")
+async def liveness():
+    """Процесс жив и обслуживает запросы."""
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def readiness(response: Response):
+    """
+    Готовность принимать трафик: БД доступна по результату последней фоновой проверки.
+    503, пока проверка не прошла - балансировщик не направит сюда запросы.
+    Недоступные реплики готовность не снимают: чтения уходят в основную базу.
+    Пока breaker открыт, фоновая проверка не проходит, а в полуоткрытом
+    состоянии она же служит пробным запросом.
+    """
+    snapshot = db_health.snapshot()
+    snapshot["circuit_breaker"] = db_breaker.snapshot()
+    if snapshot["circuit_breaker"]["state"] == "open":
+        snapshot["ready"] = False
+    if replicas.replicas:
+        snapshot["replicas"] = [replica.snapshot() for replica in replicas.replicas]
+    if not snapshot["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return snapshot
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """Метрики в текстовом формате Prometheus. Предназначен для внутренней сети."""
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
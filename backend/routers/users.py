@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends
-from typing import Annotated
+from fastapi import APIRouter, Depends, Header
+from typing import Annotated, Optional
 import schemas
 from dependencies import get_current_user
+from serialization import user_response
 
 router = APIRouter(
     prefix="/users",
     tags=["users"]
 )
 
-@router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: schemas.User = Depends(get_current_user)):
-    return current_user
-
+@router.get("/me", response_model=schemas.User, responses={304: {"description": "Профиль не изменился (If-None-Match)"}})
+async def read_users_me(
+    current_user: schemas.User = Depends(get_current_user),
+    if_none_match: Annotated[Optional[str], Header()] = None,
+):
+    # async и готовый Response: без перехода в threadpool и без повторной валидации response_model
+    return user_response(current_user, if_none_match)
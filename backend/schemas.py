@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -54,9 +54,27 @@ class User(UserBase):
             raise ValueError(f'Role must be one of {allowed_roles}')
         return v
 
+class UserPage(BaseModel):
+    items: List[User]
+    next_cursor: Optional[str] = None
+
+class SignupDay(BaseModel):
+    date: str
+    count: int
+
+class UserStats(BaseModel):
+    total: int
+    by_role: Dict[str, int]
+    by_status: Dict[str, int]
+    signups_per_day: List[SignupDay]
+    days: int
+    generated_at: datetime
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
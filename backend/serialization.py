@@ -0,0 +1,46 @@
+"""
+Быстрая сериализация ответов и условные GET.
+
+FastJSONResponse рендерит JSON через pydantic_core (Rust, как orjson) вместо
+json.dumps. USER_SERIALIZER собирается один раз при импорте: /users/me отдаёт
+уже проверенного get_current_user пользователя байтами, без повторной валидации
+response_model (и validate_role) на каждый запрос.
+
+ETag - отпечаток этих байтов: меняется вместе с любым полем профиля, а при
+неизменном профиле браузер получает 304 без тела.
+"""
+from hashlib import blake2b
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+import pydantic_core
+import schemas
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse с рендерингом через pydantic_core.to_json; datetime и модели - без jsonable_encoder."""
+
+    def render(self, content) -> bytes:
+        return pydantic_core.to_json(content)
+
+USER_SERIALIZER = TypeAdapter(schemas.User)
+
+def user_etag(body: bytes) -> str:
+    return f'W/"{blake2b(body, digest_size=12).hexdigest()}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Сравнение If-None-Match по RFC 9110 (слабое): список через запятую или "*"."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+def user_response(user: schemas.User, if_none_match: str = None) -> Response:
+    """200 с JSON профиля или 304, если у клиента та же версия."""
+    body = USER_SERIALIZER.dump_json(user)
+    etag = user_etag(body)
+    # private, no-cache: браузер хранит ответ, но каждый раз переспрашивает с If-None-Match
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
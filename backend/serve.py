@@ -0,0 +1,82 @@
+"""
+Production-запуск API: несколько воркеров uvicorn с настройками из config.Settings.
+
+    python serve.py            # из каталога backend (как в Dockerfile)
+    python -m backend.serve    # из корня репозитория
+
+Миграции (`python migrate.py`) выполняются отдельным шагом; при
+DB_MIGRATE_ON_STARTUP=true они применяются один раз здесь, до запуска воркеров.
+memory:// у лимитов и блокировок - своё хранилище в каждом процессе: при нескольких
+воркерах они переключаются на общий SQLite-файл (см. shared_limit_storage).
+SIGTERM: uvicorn перестаёт принимать соединения, дожидается текущих запросов
+(SERVER_GRACEFUL_SHUTDOWN_SECONDS) и вызывает shutdown-хук, который закрывает пулы.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    # Модули backend импортируются плоско (import models), как при запуске из его каталога
+    sys.path.insert(0, BACKEND_DIR)
+
+import uvicorn
+from config import settings
+from logging_config import configure_logging
+
+logger = configure_logging(settings.LOG_FORMAT, settings.LOG_LEVEL)
+
+SHARED_LIMIT_STORAGE_URI = "sqlite:///" + os.path.join(BACKEND_DIR, "ratelimit.db")
+
+def bootstrap_schema():
+    import migrate
+    from database import engine
+
+    try:
+        migrate.upgrade()
+    finally:
+        # Соединения не должны наследоваться воркерами
+        engine.dispose()
+
+def shared_limit_storage(workers: int):
+    """
+    С memory:// каждый воркер считал бы лимиты и неудачные логины сам по себе,
+    и фактический лимит умножался бы на число воркеров. Переключаем такие
+    хранилища на общий SQLite-файл; воркеры читают настройки из окружения.
+    """
+    if workers <= 1:
+        return
+    rate_limit_uri = settings.RATE_LIMIT_STORAGE_URI
+    lockout_uri = settings.LOGIN_LOCKOUT_STORAGE_URI or rate_limit_uri
+    if settings.RATE_LIMIT_ENABLED and rate_limit_uri.startswith("memory://"):
+        os.environ["RATE_LIMIT_STORAGE_URI"] = SHARED_LIMIT_STORAGE_URI
+        logger.warning("RATE_LIMIT_STORAGE_URI=memory:// with %d workers, using %s", workers, SHARED_LIMIT_STORAGE_URI)
+    if settings.LOGIN_LOCKOUT_ENABLED and lockout_uri.startswith("memory://"):
+        os.environ["LOGIN_LOCKOUT_STORAGE_URI"] = SHARED_LIMIT_STORAGE_URI
+        logger.warning("LOGIN_LOCKOUT_STORAGE_URI=memory:// with %d workers, using %s", workers, SHARED_LIMIT_STORAGE_URI)
+
+def main():
+    workers = settings.SERVER_WORKERS or os.cpu_count() or 1
+    shared_limit_storage(workers)
+
+    if settings.DB_MIGRATE_ON_STARTUP:
+        bootstrap_schema()
+        # Воркеры читают настройки из окружения
+        os.environ["DB_MIGRATE_ON_STARTUP"] = "false"
+
+    uvicorn.run(
+        "main:app",
+        app_dir=BACKEND_DIR,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop=settings.SERVER_LOOP,
+        http=settings.SERVER_HTTP,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+        limit_concurrency=settings.SERVER_LIMIT_CONCURRENCY or None,
+        proxy_headers=True,
+    )
+
+if __name__ == "__main__":
+    main()
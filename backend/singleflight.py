@@ -0,0 +1,95 @@
+"""
+Single-flight: одинаковые одновременные запросы к БД выполняются один раз.
+
+Дашборд фронтенда открывает несколько авторизованных запросов сразу, и каждый
+из них в get_current_user искал бы одного и того же пользователя. SingleFlight.do
+запускает поиск только для первого запроса по ключу (email), остальные ждут его
+результат - или его исключение. Ждущие не занимают ни соединение из пула, ни поток
+threadpool, поэтому одинаково помогает и при DB_ASYNC=false, и при AsyncSession.
+
+Группа локальна для процесса: каждый воркер uvicorn выполняет свой поиск.
+"""
+from config import settings
+import asyncio
+import metrics
+
+class SingleFlight:
+    """
+    Все методы вызываются из event loop одного воркера, кроме forget(), который
+    может прийти из потока threadpool (сброс кеша после commit) - операции над
+    словарём атомарны, а do() проверяет, что удаляет свою запись.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        if not self.enabled:
+            return await fn(*args, **kwargs)
+
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                # shield: отмена ждущего запроса не должна отменять общий поиск
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменён ведущий запрос (клиент ушёл), а не мы - ищем сами
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.do(key, fn, *args, **kwargs)
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executed += 1
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            # Ждущих может не быть - помечаем исключение полученным, чтобы asyncio не ругался
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def forget(self, key):
+        """Следующий вызов по ключу начнёт новый поиск (данные изменились)."""
+        self._calls.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.executed + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+        }
+
+# Поиск пользователя по email в get_current_user
+user_lookups = SingleFlight("user_lookup", enabled=settings.USER_LOOKUP_SINGLE_FLIGHT)
+
+@metrics.register_collector
+def _single_flight_metrics():
+    stats = user_lookups.stats()
+    labels = {"group": user_lookups.name}
+    yield "single_flight_in_flight", "gauge", "Lookups currently in flight", labels, stats["in_flight"]
+    for outcome in ("executed", "coalesced", "errors"):
+        yield (
+            "single_flight_calls_total", "counter", "Single-flight calls that ran the lookup or shared another's result",
+            {**labels, "outcome": outcome}, stats[outcome],
+        )
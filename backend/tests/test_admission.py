@@ -0,0 +1,97 @@
+"""AdmissionMiddleware и AdaptiveLimit: 503 при занятом лимите, подстройка лимита по AIMD."""
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import anyio
+import httpx
+import pytest
+from admission import PRIORITY_CRITICAL, PRIORITY_LOW, PRIORITY_NORMAL, AdaptiveLimit, AdmissionMiddleware
+
+def make_limit(initial=2, target_latency=0.5):
+    return AdaptiveLimit(initial=initial, min_limit=1, max_limit=8, target_latency=target_latency, backoff=0.5)
+
+def make_app(limiter: AdaptiveLimit, gate: anyio.Event, status_code: int = 200):
+    async def handler(request):
+        await gate.wait()
+        return JSONResponse({"ok": True}, status_code=status_code)
+
+    routes = [Route(path, handler) for path in ("/slow", "/admin/users/export")]
+    return AdmissionMiddleware(Starlette(routes=routes), limiter=limiter, retry_after=3)
+
+async def wait_in_flight(limiter: AdaptiveLimit, count: int):
+    with anyio.fail_after(2):
+        while limiter.in_flight < count:
+            await anyio.sleep(0.01)
+
+@pytest.mark.anyio
+async def test_saturated_limit_rejects_with_503():
+    # normal получает 85% лимита: int(3 * 0.85) = 2 слота
+    limiter, gate = make_limit(initial=3), anyio.Event()
+    transport = httpx.ASGITransport(app=make_app(limiter, gate))
+    responses = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def call():
+            responses.append(await client.get("/slow"))
+
+        async with anyio.create_task_group() as tasks:
+            tasks.start_soon(call)
+            tasks.start_soon(call)
+            await wait_in_flight(limiter, 2)
+
+            rejected = await client.get("/slow")
+            assert rejected.status_code == 503
+            assert rejected.headers["Retry-After"] == "3"
+            gate.set()
+
+        # Слоты освободились - запрос снова допускается
+        assert (await client.get("/slow")).status_code == 200
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert limiter.in_flight == 0
+    assert limiter.rejected == 1
+
+def test_low_priority_is_shed_first():
+    limiter = make_limit(initial=5)
+    for _ in range(3):
+        assert limiter.try_acquire(PRIORITY_NORMAL)
+
+    # low получает 60% лимита (3 слота), critical - весь лимит
+    assert not limiter.try_acquire(PRIORITY_LOW)
+    assert limiter.try_acquire(PRIORITY_NORMAL)
+    assert limiter.try_acquire(PRIORITY_CRITICAL)
+    assert not limiter.try_acquire(PRIORITY_CRITICAL)
+
+def test_limit_backs_off_on_slow_responses_and_recovers():
+    limiter = make_limit(initial=8, target_latency=0.5)
+
+    limiter.try_acquire()
+    limiter.release(latency=1.0)
+    assert limiter.limit == 4
+    # Медленные ответы той же волны - один сигнал, а не экспоненциальное падение
+    limiter.try_acquire()
+    limiter.release(latency=1.0)
+    assert limiter.limit == 4
+
+    for _ in range(50):
+        slots = int(limiter.limit)
+        for _ in range(slots):
+            assert limiter.try_acquire(PRIORITY_CRITICAL)
+        for _ in range(slots):
+            limiter.release(latency=0.01)
+    assert limiter.limit == limiter.max_limit
+    assert limiter.in_flight == 0
+
+@pytest.mark.anyio
+async def test_overload_status_shrinks_limit_except_for_bulk_paths():
+    limiter, gate = make_limit(initial=4), anyio.Event()
+    gate.set()
+    transport = httpx.ASGITransport(app=make_app(limiter, gate, status_code=503))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/admin/users/export")
+        assert limiter.limit == 4
+        await client.get("/slow")
+        assert limiter.limit == 2
+
+    assert limiter.in_flight == 0
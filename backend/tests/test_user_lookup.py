@@ -0,0 +1,96 @@
+"""get_current_user: общий поиск для одновременных запросов и устаревший кеш при открытом breaker."""
+import anyio
+import pytest
+from cache import user_cache
+from database import db_breaker
+from singleflight import SingleFlight
+
+@pytest.fixture
+def open_breaker():
+    """Открывает breaker основной базы по вызову; после теста он снова закрыт."""
+    def open_():
+        for _ in range(db_breaker.failure_threshold):
+            db_breaker.record_failure(RuntimeError("database is down"))
+    yield open_
+    db_breaker.record_success()
+
+def login(client, email: str):
+    client.cookies.clear()
+    client.post("/register", json={"email": email, "password": "StrongPass1", "full_name": "Test"})
+    response = client.post("/login", json={"email": email, "password": "StrongPass1"})
+    assert response.status_code == 200
+
+def test_stale_user_is_served_while_breaker_is_open(client, open_breaker):
+    login(client, "stale@example.com")
+    assert client.get("/users/me").status_code == 200
+    # TTL истёк, но запись ещё в пределах USER_CACHE_STALE_SECONDS
+    user_cache.set("stale@example.com", user_cache.get("stale@example.com"), ttl_seconds=0)
+    open_breaker()
+    stale_hits = user_cache.stale_hits
+
+    response = client.get("/users/me")
+
+    assert response.status_code == 200
+    assert response.json()["email"] == "stale@example.com"
+    assert user_cache.stale_hits == stale_hits + 1
+
+def test_uncached_user_gets_503_while_breaker_is_open(client, open_breaker):
+    login(client, "uncached@example.com")
+    user_cache.invalidate("uncached@example.com")
+    open_breaker()
+
+    response = client.get("/users/me")
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+@pytest.mark.anyio
+async def test_concurrent_lookups_share_one_call():
+    group, calls, gate = SingleFlight("test"), [], anyio.Event()
+    results = []
+
+    async def lookup(key):
+        calls.append(key)
+        await gate.wait()
+        return {"email": key}
+
+    async def call():
+        results.append(await group.do("a@example.com", lookup, "a@example.com"))
+
+    async with anyio.create_task_group() as tasks:
+        for _ in range(5):
+            tasks.start_soon(call)
+        with anyio.fail_after(2):
+            while not calls:
+                await anyio.sleep(0.01)
+        await anyio.sleep(0.01)
+        gate.set()
+
+    assert calls == ["a@example.com"]
+    assert results == [{"email": "a@example.com"}] * 5
+    assert group.stats()["coalesced"] == 4
+    assert group.stats()["in_flight"] == 0
+
+@pytest.mark.anyio
+async def test_concurrent_lookups_share_the_error():
+    group, gate = SingleFlight("test"), anyio.Event()
+    errors = []
+
+    async def lookup():
+        await gate.wait()
+        raise RuntimeError("lookup failed")
+
+    async def call():
+        try:
+            await group.do("a@example.com", lookup)
+        except RuntimeError as e:
+            errors.append(e)
+
+    async with anyio.create_task_group() as tasks:
+        for _ in range(3):
+            tasks.start_soon(call)
+        await anyio.sleep(0.05)
+        gate.set()
+
+    assert len(errors) == 3
+    assert group.errors == 1
@@ -0,0 +1,52 @@
+from datetime import datetime
+from config import settings
+from database import SessionLocal
+import logging
+import threading
+import crud
+
+logger = logging.getLogger("app")
+
+class RefreshTokenPurger:
+    """
+    Фоновое удаление истёкших refresh-токенов. Каждый /refresh добавляет строку,
+    и без очистки refresh_tokens растёт на строку за сессию раз в ACCESS_TOKEN_EXPIRE_MINUTES.
+    DELETE идемпотентен, поэтому одновременная работа в нескольких воркерах безопасна.
+    """
+
+    def __init__(self, session_factory, interval_seconds: float):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.last_run_at = None
+        self.last_deleted = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> int:
+        try:
+            with self.session_factory() as db:
+                self.last_deleted, self.last_error = crud.purge_expired_refresh_tokens(db), None
+        except Exception as e:
+            logger.exception("Refresh token purge failed")
+            self.last_error = str(e)
+        self.last_run_at = datetime.utcnow()
+        return self.last_deleted
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.run_once()
+
+    def start(self):
+        if self.interval_seconds > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="refresh-token-purge", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+refresh_token_purger = RefreshTokenPurger(SessionLocal, settings.REFRESH_TOKEN_PURGE_INTERVAL_SECONDS)
@@ -0,0 +1,289 @@
+"""
+Счётчики пользователей для /admin/stats без COUNT(*) по users.
+
+Таблица user_stats хранит готовые числа: всего, по ролям, активные/неактивные
+и регистрации по дням. Слушатели ORM меняют их в той же транзакции, что и
+строку users (create_user, смена роли или is_active); массовый импорт, который
+вставляет строки без ORM-событий, вызывает record_inserted_rows сам.
+Изменения в обход приложения (ручной SQL, сбой посередине) исправляет
+StatsReconciler: раз в USER_STATS_RECONCILE_INTERVAL_SECONDS пересчитывает
+счётчики по users и прибавляет разницу к разошедшимся. Чтение закешировано на
+USER_STATS_CACHE_TTL_SECONDS, поэтому эндпоинт не зависит от числа пользователей.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, inspect, select, text, update
+from sqlalchemy.dialects import mysql, sqlite
+from cache import TTLCache
+from config import settings
+from database import engine
+from singleflight import SingleFlight
+import logging
+import threading
+import time
+import crud
+import metrics
+import models
+
+logger = logging.getLogger("app")
+
+UserStat = models.UserStat
+TOTAL_BUCKET = "all"
+
+def _role_bucket(role) -> str:
+    return role or models.User.ROLE_USER
+
+def _status_bucket(is_active) -> str:
+    # NULL считается активным, как default колонки
+    return "inactive" if is_active is False else "active"
+
+def _day_bucket(value) -> str:
+    return str(value)[:10]
+
+def user_deltas(role, is_active, signup_day=None, sign: int = 1) -> Counter:
+    """Изменения счётчиков от появления (sign=1) или удаления (sign=-1) одного пользователя."""
+    deltas = Counter({
+        (UserStat.DIMENSION_TOTAL, TOTAL_BUCKET): sign,
+        (UserStat.DIMENSION_ROLE, _role_bucket(role)): sign,
+        (UserStat.DIMENSION_STATUS, _status_bucket(is_active)): sign,
+    })
+    if signup_day is not None:
+        deltas[(UserStat.DIMENSION_SIGNUPS, _day_bucket(signup_day))] += sign
+    return deltas
+
+def _upsert(connection, values: dict):
+    """
+    values: {(dimension, bucket): число}. Прибавляет число к счётчику одним
+    INSERT ... ON CONFLICT / ON DUPLICATE KEY, чтобы одновременные регистрации
+    не теряли инкременты.
+    """
+    rows = [
+        {"dimension": dimension, "bucket": bucket, "count": count}
+        for (dimension, bucket), count in values.items()
+        if count
+    ]
+    if not rows:
+        return
+    table = UserStat.__table__
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        statement = mysql.insert(table)
+        new_count = statement.inserted.count
+        statement = statement.on_duplicate_key_update(count=table.c.count + new_count)
+        connection.execute(statement, rows)
+    elif dialect == "sqlite":
+        statement = sqlite.insert(table)
+        new_count = statement.excluded.count
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.dimension, table.c.bucket],
+            set_={"count": table.c.count + new_count},
+        )
+        connection.execute(statement, rows)
+    else:
+        for row in rows:
+            match = (table.c.dimension == row["dimension"]) & (table.c.bucket == row["bucket"])
+            if connection.execute(update(table).where(match).values(count=table.c.count + row["count"])).rowcount == 0:
+                connection.execute(table.insert().values(**row))
+
+def record_inserted_rows(connection, rows):
+    """Учитывает строки users, вставленные без ORM (bulk.py); вызывать до commit."""
+    # Часы сервера БД, как у server_default created_at (на MySQL - часовой пояс сессии,
+    # а не UTC); расхождение на границе суток между INSERT и этим запросом исправит сверка
+    today = connection.execute(select(func.now())).scalar()
+    deltas = Counter()
+    for row in rows:
+        deltas.update(user_deltas(row.get("role"), row.get("is_active", True), today))
+    _upsert(connection, deltas)
+
+@event.listens_for(models.User, "after_insert")
+def _count_insert(mapper, connection, target):
+    # День регистрации - из самой строки, как в count_from_users. created_at заполняет
+    # сервер (func.now()): без RETURNING (MySQL) после INSERT он ещё не загружен
+    created_at = inspect(target).dict.get("created_at")
+    if created_at is None:
+        users = models.User.__table__
+        created_at = connection.execute(select(users.c.created_at).where(users.c.id == target.id)).scalar()
+    _upsert(connection, user_deltas(target.role, target.is_active, created_at))
+
+@event.listens_for(models.User, "after_update")
+def _count_update(mapper, connection, target):
+    state = inspect(target)
+    role, status = state.attrs.role.history, state.attrs.is_active.history
+    if not (role.has_changes() or status.has_changes()):
+        return
+    old_role = role.deleted[0] if role.deleted else target.role
+    old_status = status.deleted[0] if status.deleted else target.is_active
+    deltas = user_deltas(old_role, old_status, sign=-1)
+    deltas.update(user_deltas(target.role, target.is_active))
+    _upsert(connection, deltas)
+
+@event.listens_for(models.User, "after_delete")
+def _count_delete(mapper, connection, target):
+    created_at = inspect(target).dict.get("created_at")
+    _upsert(connection, user_deltas(target.role, target.is_active, created_at, sign=-1))
+
+def count_from_users(connection) -> Counter:
+    """Точные значения счётчиков по таблице users (GROUP BY) - только для сверки."""
+    users = models.User.__table__
+    actual = Counter()
+    actual[(UserStat.DIMENSION_TOTAL, TOTAL_BUCKET)] = connection.execute(select(func.count()).select_from(users)).scalar()
+    for role, count in connection.execute(select(users.c.role, func.count()).group_by(users.c.role)):
+        actual[(UserStat.DIMENSION_ROLE, _role_bucket(role))] += count
+    for is_active, count in connection.execute(select(users.c.is_active, func.count()).group_by(users.c.is_active)):
+        actual[(UserStat.DIMENSION_STATUS, _status_bucket(is_active))] += count
+    day = func.date(users.c.created_at)
+    for signup_day, count in connection.execute(
+        select(day, func.count()).where(users.c.created_at.is_not(None)).group_by(day)
+    ):
+        actual[(UserStat.DIMENSION_SIGNUPS, _day_bucket(signup_day))] += count
+    return actual
+
+RECONCILE_LOCK = "user_stats_reconcile"
+
+@contextmanager
+def _reconcile_lock(connection):
+    """
+    Одна сверка на все воркеры и хосты: на MySQL - GET_LOCK без ожидания, как
+    в migrate.py; занято - эта сверка пропускается. На SQLite отдельной блокировки
+    нет: reconcile начинает транзакцию с BEGIN IMMEDIATE, и вторая сверка ждёт
+    первую, а затем читает уже исправленные счётчики.
+    """
+    if connection.dialect.name != "mysql":
+        yield True
+        return
+    acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": RECONCILE_LOCK}).scalar() == 1
+    connection.commit()
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": RECONCILE_LOCK})
+            connection.commit()
+
+def reconcile(engine) -> int:
+    """
+    Сверяет user_stats с users и возвращает число исправленных счётчиков.
+    Хранимые значения и подсчёт по users читаются из одного снимка транзакции,
+    а разница прибавляется, а не записывается поверх: инкременты регистраций,
+    закоммиченных после снимка, сохраняются.
+    """
+    table = UserStat.__table__
+    with engine.connect() as connection:
+        if connection.dialect.name == "mysql":
+            # Оба чтения - из одного снимка только при REPEATABLE READ
+            connection = connection.execution_options(isolation_level="REPEATABLE READ")
+        with _reconcile_lock(connection) as acquired:
+            if not acquired:
+                return 0
+            with connection.begin():
+                if connection.dialect.name == "sqlite":
+                    # pysqlite не шлёт BEGIN перед SELECT: каждое чтение видело бы свой
+                    # снимок, и регистрация между ними попала бы в разницу дважды.
+                    # Блокировка записи до чтений: регистрации ждут конца сверки
+                    connection.exec_driver_sql("BEGIN IMMEDIATE")
+                stored = Counter({
+                    (row.dimension, row.bucket): row.count
+                    for row in connection.execute(select(table.c.dimension, table.c.bucket, table.c.count))
+                })
+                actual = count_from_users(connection)
+                repaired = {key: actual[key] - stored[key] for key in set(actual) | set(stored) if actual[key] != stored[key]}
+                _upsert(connection, repaired)
+    if repaired:
+        logger.warning("User stats drift repaired", extra={"counters": len(repaired)})
+        metrics.USER_STATS_REPAIRED.inc(amount=len(repaired))
+        stats_cache.clear()
+    return len(repaired)
+
+def read_stats(db, days: int) -> dict:
+    """Счётчики из user_stats: несколько строк ролей и статусов плюс не больше days дней."""
+    since = _day_bucket(datetime.utcnow().date() - timedelta(days=days - 1))
+    rows = db.execute(
+        select(UserStat.dimension, UserStat.bucket, UserStat.count).where(
+            (UserStat.dimension != UserStat.DIMENSION_SIGNUPS) | (UserStat.bucket >= since)
+        )
+    )
+    stats = {"total": 0, "by_role": {}, "by_status": {"active": 0, "inactive": 0}, "signups_per_day": []}
+    for dimension, bucket, count in rows:
+        if dimension == UserStat.DIMENSION_TOTAL:
+            stats["total"] = count
+        elif dimension == UserStat.DIMENSION_ROLE:
+            # Строка роли остаётся с нулём, когда её последний пользователь сменил роль
+            if count:
+                stats["by_role"][bucket] = count
+        elif dimension == UserStat.DIMENSION_STATUS:
+            stats["by_status"][bucket] = count
+        elif count:
+            stats["signups_per_day"].append({"date": bucket, "count": count})
+    stats["signups_per_day"].sort(key=lambda item: item["date"])
+    stats["days"] = days
+    stats["generated_at"] = datetime.utcnow()
+    return stats
+
+# Ключ - число дней в выборке
+stats_cache = TTLCache(64, settings.USER_STATS_CACHE_TTL_SECONDS)
+# Когда запись кеша истекла, дашборды нескольких админов читают user_stats один раз
+_stats_reads = SingleFlight("user_stats")
+
+async def _read_and_cache(db, days: int) -> dict:
+    stats = await crud.run_sync(db, read_stats, days)
+    stats_cache.set(days, stats)
+    return stats
+
+async def get_stats(db, days: int) -> dict:
+    stats = stats_cache.get(days)
+    if stats is None:
+        stats = await _stats_reads.do(days, _read_and_cache, db, days)
+    return stats
+
+class StatsReconciler:
+    """Фоновая сверка user_stats, как DatabaseHealthMonitor: поток с интервалом."""
+
+    def __init__(self, engine, interval_seconds: float):
+        self.engine = engine
+        self.interval_seconds = interval_seconds
+        self.last_run_at = None
+        self.last_repaired = None
+        self.last_error = None
+        self.duration_ms = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> int:
+        started = time.perf_counter()
+        try:
+            self.last_repaired, self.last_error = reconcile(self.engine), None
+        except Exception as e:
+            logger.exception("User stats reconciliation failed")
+            self.last_error = str(e)
+        self.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.last_run_at = datetime.utcnow()
+        return self.last_repaired
+
+    def _run(self):
+        # Первая сверка - через интервал: после миграции 0005 счётчики уже точные
+        while not self._stop.wait(self.interval_seconds):
+            self.run_once()
+
+    def start(self):
+        if self.interval_seconds > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="user-stats-reconcile", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def snapshot(self) -> dict:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "last_run_at": self.last_run_at,
+            "last_repaired": self.last_repaired,
+            "duration_ms": self.duration_ms,
+            "error": self.last_error,
+        }
+
+reconciler = StatsReconciler(engine, settings.USER_STATS_RECONCILE_INTERVAL_SECONDS)
@@ -14,8 +14,27 @@ export interface AuthResponse {
   token_type: string;
 }
 
+// Эндпоинты, для которых 401 не означает истёкший access-токен
+// (/admin/verify-password отвечает 401 на неверный админ-пароль)
+const NO_REFRESH_ENDPOINTS = ['/login', '/register', '/refresh', '/logout', '/admin/verify-password'];
+
+let refreshPromise: Promise<boolean> | null = null;
+
+// Access-токен живёт недолго: параллельные запросы с 401 ждут один общий /refresh
+function refreshSession(): Promise<boolean> {
+  if (!refreshPromise) {
+    refreshPromise = fetch(`${API_URL}/refresh`, { method: 'POST', credentials: 'include' })
+      .then((response) => response.ok)
+      .catch(() => false)
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+}
+
 // Generic request helper to handle fetch, headers, and errors
-async function request<T>(endpoint: string, options: RequestInit = {}): Promise<T> {
+async function request<T>(endpoint: string, options: RequestInit = {}, retry = true): Promise<T> {
   const controller = new AbortController();
   const timeoutId = setTimeout(() => controller.abort(), 10000); // 10 seconds timeout
 
@@ -35,6 +54,12 @@ async function request<T>(endpoint: string, options: RequestInit = {}): Promise<
     const response = await fetch(`${API_URL}${endpoint}`, config);
     clearTimeout(timeoutId);
 
+    if (response.status === 401 && retry && !NO_REFRESH_ENDPOINTS.includes(endpoint)) {
+      if (await refreshSession()) {
+        return request<T>(endpoint, options, false);
+      }
+    }
+
     if (!response.ok) {
       let errorMessage = 'Произошла ошибка';
       try {
@@ -88,3 +113,53 @@ export const verifyPassword = (password: string) => {
     body: JSON.stringify({ password }),
   });
 };
+
+export interface AdminUser {
+  id: number;
+  email: string;
+  full_name?: string | null;
+  role: string;
+  is_active: boolean;
+  created_at: string;
+}
+
+export interface UserPage {
+  items: AdminUser[];
+  next_cursor: string | null;
+}
+
+export interface UserListParams {
+  cursor?: string;
+  limit?: number;
+  role?: string;
+  is_active?: boolean;
+  email?: string;
+  full_name?: string;
+}
+
+// Следующая страница запрашивается с next_cursor из предыдущего ответа
+export const listUsers = (params: UserListParams = {}) => {
+  const query = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== undefined && value !== '') query.set(key, String(value));
+  });
+  const suffix = query.toString() ? `?${query}` : '';
+  return request<UserPage>(`/admin/users${suffix}`, {
+    method: 'GET',
+  });
+};
+
+export interface UserStats {
+  total: number;
+  by_role: Record<string, number>;
+  by_status: Record<string, number>;
+  signups_per_day: { date: string; count: number }[];
+  days: number;
+  generated_at: string;
+}
+
+export const getUserStats = (days = 30) => {
+  return request<UserStats>(`/admin/stats?days=${days}`, {
+    method: 'GET',
+  });
+};